@@ -0,0 +1,42 @@
+-- Creates a project together with its owner's membership (and any initial members) in one transaction.
+-- Called through RPC by create_project. Runs with the caller's privileges so the usual RLS policies still apply.
+-- Run once in the Supabase SQL editor.
+
+create or replace function public.create_project_with_members(
+    project_name text,
+    project_description text,
+    project_budget numeric,
+    initial_members jsonb default '[]'::jsonb
+)
+returns jsonb
+language plpgsql
+security invoker
+as $$
+declare
+    new_project public.projects;
+    owner uuid := auth.uid();
+begin
+    if owner is null then
+        raise exception 'Not authenticated';
+    end if;
+
+    insert into public.projects (name, description, budget, owner_id)
+    values (project_name, project_description, project_budget, owner)
+    returning * into new_project;
+
+    insert into public.project_members (project_id, user_id, role)
+    values (new_project.id, owner, 'Owner');
+
+    insert into public.project_members (project_id, user_id, role)
+    select distinct on (member.user_id) new_project.id, member.user_id, member.role
+    from jsonb_to_recordset(initial_members) as member(user_id uuid, role text)
+    where member.user_id <> owner;
+
+    return to_jsonb(new_project) || jsonb_build_object(
+        'members',
+        (select coalesce(jsonb_agg(jsonb_build_object('user_id', pm.user_id, 'role', pm.role)), '[]'::jsonb)
+         from public.project_members pm
+         where pm.project_id = new_project.id)
+    );
+end;
+$$;
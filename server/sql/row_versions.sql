@@ -0,0 +1,26 @@
+-- Row versions used for optimistic concurrency on task and project updates (If-Match).
+-- Every update bumps the row's version, so a client's If-Match only succeeds against the version it read.
+-- Run once in the Supabase SQL editor.
+
+alter table public.tasks add column if not exists version integer not null default 1;
+alter table public.projects add column if not exists version integer not null default 1;
+
+create or replace function public.bump_row_version()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.version := old.version + 1;
+    return new;
+end;
+$$;
+
+drop trigger if exists tasks_bump_version on public.tasks;
+create trigger tasks_bump_version
+    before update on public.tasks
+    for each row execute function public.bump_row_version();
+
+drop trigger if exists projects_bump_version on public.projects;
+create trigger projects_bump_version
+    before update on public.projects
+    for each row execute function public.bump_row_version();
@@ -0,0 +1,59 @@
+-- Database-side user search used when USER_SEARCH_MODE=trgm.
+-- Run once in the Supabase SQL editor.
+
+create extension if not exists pg_trgm;
+
+create index if not exists userprofile_username_trgm_idx
+    on public.userprofile using gin (lower(username) gin_trgm_ops);
+
+create index if not exists userprofile_email_trgm_idx
+    on public.userprofile using gin (lower(email) gin_trgm_ops);
+
+create index if not exists userprofile_full_name_trgm_idx
+    on public.userprofile using gin (lower(first_name || ' ' || last_name) gin_trgm_ops);
+
+-- Returns up to result_limit profiles ranked by trigram similarity (lower search_rank is better).
+-- Pass the search_rank and username of the last row as after_rank/after_username to get the next page.
+create or replace function public.search_userprofiles(
+    search_term text,
+    exclude_id uuid,
+    result_limit integer default 20,
+    after_rank real default null,
+    after_username text default null
+)
+returns table (
+    id uuid,
+    email text,
+    first_name text,
+    last_name text,
+    username text,
+    "position" text,
+    profile_photo_url text,
+    search_rank real
+)
+language sql
+stable
+as $$
+    with matches as (
+        select
+            p.id, p.email::text, p.first_name, p.last_name, p.username, p."position", p.profile_photo_url,
+            -greatest(
+                similarity(lower(p.username), lower(search_term)),
+                similarity(lower(p.email), lower(search_term)),
+                similarity(lower(p.first_name || ' ' || p.last_name), lower(search_term))
+            )::real as search_rank
+        from public.userprofile p
+        where p.id <> exclude_id
+          and (
+              lower(p.username) % lower(search_term)
+              or lower(p.email) % lower(search_term)
+              or lower(p.first_name || ' ' || p.last_name) % lower(search_term)
+              or lower(p.username) like lower(search_term) || '%'
+              or lower(p.email) like lower(search_term) || '%'
+          )
+    )
+    select * from matches
+    where after_rank is null or (matches.search_rank, matches.username) > (after_rank, after_username)
+    order by matches.search_rank, matches.username
+    limit result_limit;
+$$;
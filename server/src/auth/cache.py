@@ -0,0 +1,123 @@
+import hashlib
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from src.config import auth_cache_size, auth_revoked_size
+
+
+def hash_token(token: str) -> str:
+    """
+        Hashes a JWT so raw tokens are never kept in memory as cache keys
+    """
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class AuthContextCache:
+    """
+        Bounded LRU cache of verified AuthContexts keyed by token hash.
+        Entries expire at the token's exp claim and revoked (logged out) tokens are never served again.
+        Revocations are kept in a heap ordered by expiry: expired ones are dropped first, and when more than max_revoked are still live
+        the ones closest to expiring are dropped.
+    """
+    def __init__(self, max_size: int, max_revoked: int):
+        self.max_size = max_size
+        self.max_revoked = max_revoked
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._revoked = {}
+        self._revoked_expiry = []
+        self._lock = threading.Lock()
+
+    def get(self, token: str):
+        """
+            Returns the cached AuthContext for the token or None if it is missing, expired or revoked
+        """
+        token_hash = hash_token(token)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(token_hash)
+            if entry is None or token_hash in self._revoked:
+                self.misses += 1
+                return None
+
+            ctx, expires_at = entry
+            if expires_at <= now:
+                del self._entries[token_hash]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(token_hash)
+            self.hits += 1
+            return ctx
+
+    def set(self, token: str, ctx, expires_at: float):
+        """
+            Caches an AuthContext until the token expires, evicting the least recently used entry when full
+        """
+        token_hash = hash_token(token)
+
+        with self._lock:
+            if token_hash in self._revoked:
+                return
+
+            self._entries[token_hash] = (ctx, expires_at)
+            self._entries.move_to_end(token_hash)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def is_revoked(self, token: str) -> bool:
+        """
+            Checks whether the token was logged out in this process
+        """
+        with self._lock:
+            return hash_token(token) in self._revoked
+
+    def revoke(self, token: str, expires_at: float):
+        """
+            Evicts the token and remembers it as revoked until it would have expired anyway
+        """
+        token_hash = hash_token(token)
+        now = time.time()
+
+        with self._lock:
+            self._entries.pop(token_hash, None)
+            if self._revoked.get(token_hash) == expires_at:
+                return
+
+            self._revoked[token_hash] = expires_at
+            heapq.heappush(self._revoked_expiry, (expires_at, token_hash))
+
+            #Expired tokens are rejected by verification so they no longer need to be tracked
+            while self._revoked_expiry:
+                revoked_until, soonest_hash = self._revoked_expiry[0]
+                if self._revoked.get(soonest_hash) != revoked_until:
+                    #Left behind when the same token was revoked again
+                    heapq.heappop(self._revoked_expiry)
+                    continue
+                if revoked_until > now and len(self._revoked) <= self.max_revoked:
+                    break
+                heapq.heappop(self._revoked_expiry)
+                del self._revoked[soonest_hash]
+
+    def stats(self) -> dict:
+        """
+            Returns the cache counters used for tuning AUTH_CACHE_SIZE
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "revoked": len(self._revoked),
+                "max_revoked": self.max_revoked
+            }
+
+
+auth_cache = AuthContextCache(max_size=auth_cache_size, max_revoked=auth_revoked_size)
@@ -1,6 +1,11 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from src.database import supabase 
+from fastapi.concurrency import run_in_threadpool
+from src.database import supabase, get_db
+from src.config import auth_verify_mode
+from src.auth.tokens import decode_token, user_from_claims, token_expiry, SigningKeyUnavailable
+from src.auth.cache import auth_cache
+from src.metrics import AUTH_LATENCY
 from gotrue.types import User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
@@ -10,18 +15,54 @@ class AuthContext:
     def __init__(self, user: User, token: str):
         self.user = user
         self.token = token
-        self.db = supabase.postgrest.auth(token)
+        self.db = get_db(token)
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
+async def _verify_remotely(token: str) -> User:
     """
-        Dependency to get the current user from the JWT and verify it with Supabase.
+        Verifies the JWT by asking Supabase Auth for the user it belongs to (one HTTP round trip)
+    """
+    response = await supabase.auth.get_user(token)
+    return response.user
+
+async def _verify_locally(token: str) -> User:
+    """
+        Verifies the JWT in-process against the cached JWT secret or JWKS.
+        Falls back to Supabase Auth only when no signing key is available locally.
+    """
+    try:
+        #Runs in a worker thread because a JWKS refresh is a blocking HTTP call
+        claims = await run_in_threadpool(decode_token, token)
+    except SigningKeyUnavailable:
+        return await _verify_remotely(token)
+
+    return user_from_claims(claims)
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    """
+        Dependency to get the current user from the JWT and verify it.
+        Tokens are verified locally by default, set AUTH_VERIFY_MODE=remote to verify every token with Supabase instead.
+        Verified contexts are cached until the token expires or the user logs out.
         Returns the user object.
         This is used to create protected backend routes. 
     """
     try:
+        if auth_cache.is_revoked(token):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked",
+                headers={"WWW-Authenticate": "Bearer"}
+            )
+
+        cached_ctx = auth_cache.get(token)
+        if cached_ctx:
+            return cached_ctx
+
         #Gets the user based on their JWT 
-        response = supabase.auth.get_user(token)
-        user = response.user 
+        with AUTH_LATENCY.labels(auth_verify_mode).time():
+            if auth_verify_mode == "remote":
+                user = await _verify_remotely(token)
+            else:
+                user = await _verify_locally(token)
 
         if not user:
             raise HTTPException(
@@ -30,7 +71,11 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
                 headers={"WWW-Authenticate": "Bearer"}
             )
 
-        return AuthContext(user=user, token=token)
+        ctx = AuthContext(user=user, token=token)
+        auth_cache.set(token, ctx, token_expiry(token))
+        return ctx
+    except HTTPException:
+        raise
     except Exception as e:
         err_message = str(e)
         raise HTTPException(
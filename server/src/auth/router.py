@@ -1,7 +1,9 @@
 from fastapi import APIRouter, status, HTTPException, Form, File, UploadFile, Depends, Response
 from src.auth.schemas import UserBase, UserSignup, UserLogin, UserLoggedIn
 from src.auth.service import signup_user, signin_user, signout_user
-from src.auth.dependencies import get_current_user, oauth2_scheme
+from src.auth.dependencies import get_current_user, oauth2_scheme, AuthContext
+from src.auth.cache import auth_cache
+from src.operator_auth import operator_only
 from typing import Optional
 from pydantic import ValidationError
 
@@ -58,11 +60,11 @@ async def create_user(
 
 
 @auth_router.post("/login", status_code=status.HTTP_202_ACCEPTED)
-def login_user(user: UserLogin):
+async def login_user(user: UserLogin):
     """
         Logs in a user using Supabase and returns both the user's profile and their session data which includes their JWT
     """
-    user_data = signin_user(user)
+    user_data = await signin_user(user)
 
     if "error" in user_data:
         raise HTTPException(
@@ -74,11 +76,11 @@ def login_user(user: UserLogin):
     return user_data["data"]
 
 @auth_router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
-def logout_user(token: str = Depends(oauth2_scheme)):
+async def logout_user(token: str = Depends(oauth2_scheme)):
     """
         Logs out a user using Supabase by invalidating their JWT 
     """
-    signout_data = signout_user(token)
+    signout_data = await signout_user(token)
     
     if "error" in signout_data:
         raise HTTPException(
@@ -88,3 +90,11 @@ def logout_user(token: str = Depends(oauth2_scheme)):
 
     #Successful logout will return nothing
     return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@auth_router.get("/cache-stats", status_code=status.HTTP_200_OK, dependencies=[Depends(operator_only)])
+async def get_auth_cache_stats():
+    """
+        Returns the hit/miss counters of the AuthContext cache for tuning its size
+    """
+    return auth_cache.stats()
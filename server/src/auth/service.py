@@ -1,15 +1,29 @@
 from fastapi import UploadFile
-from src.database import supabase
+from fastapi.concurrency import run_in_threadpool
+from src.database import supabase, get_db, get_storage
 from src.auth.schemas import UserBase, UserSignup, UserLogin, UserLoggedIn
 from supabase_auth.errors import AuthApiError
+from src.auth.cache import auth_cache
+from src.auth.tokens import decode_token, token_expiry, SigningKeyUnavailable
+from src.users.search import user_search_index
+from src.jobs.queue import job_queue
+from src.users.photos import PhotoRejected, PHOTO_BUCKET, PHOTO_FOLDER, AVATAR_SIZE, process_photo, upload_thumbnails
 from typing import Optional
 
 async def signup_user(user: UserSignup, profile_photo: Optional[UploadFile]):
     """
-        Signs up a user through Supabase if an account with their email does not exist and then adds that user to the userprofile table
+        Signs up a user through Supabase if an account with their email does not exist and then adds that user to the userprofile table.
+        A profile photo is checked and resized before the account is created, so a rejected photo does not leave an account without a profile.
     """
     try:
-        response = supabase.auth.sign_up(
+        thumbnails = None
+        if profile_photo:
+            try:
+                thumbnails = await process_photo(profile_photo)
+            except PhotoRejected as e:
+                return {"error": str(e)}
+
+        response = await supabase.auth.sign_up(
             {
                 "email": user.email,
                 "password": user.password 
@@ -17,30 +31,27 @@ async def signup_user(user: UserSignup, profile_photo: Optional[UploadFile]):
         )
  
         if response.user and response.session:
+            #The shared client only handles auth, since another signup or signin may put its own token on it at any time
+            access_token = response.session.access_token
             print(user)
             user_profile = user.model_dump(exclude={"password"})
             user_profile["id"] = response.user.id
-            profile_photo_url = supabase.storage.from_("ErgoProject").get_public_url("user_profile_pictures/default.png")
 
-            if profile_photo:
-                try:
-                    file_ext = profile_photo.filename.split(".")[-1]
-                    photo_path = f"user_profile_pictures/{response.user.id}.{file_ext}"
-                    photo_contents = await profile_photo.read()
+            #The profile starts with the default photo, uploaded photos replace it once the background job has stored them
+            profile_photo_url = await get_storage(access_token).from_(PHOTO_BUCKET).get_public_url(f"{PHOTO_FOLDER}/default.png")
 
-                    supabase.storage.from_("ErgoProject").upload(
-                        path=photo_path,
-                        file=photo_contents,
-                        file_options={"content-type": profile_photo.content_type, "upsert": "true"}
-                    )
+            user_profile["profile_photo_url"] = profile_photo_url 
+            print(user_profile)
+            user_profile_response = await get_db(access_token).from_("userprofile").insert(user_profile).execute()
+            user_search_index.add(user_profile_response.data[0])
 
-                    profile_photo_url = supabase.storage.from_("ErgoProject").get_public_url(photo_path)
+            if thumbnails:
+                #The account already exists, so a photo that cannot be stored must not turn the signup into an error
+                try:
+                    await job_queue.submit("store_profile_photo", store_profile_photo, response.user.id, access_token, thumbnails)
                 except Exception as e:
-                    return {"error": str(e)}
+                    print(f"Could not store the profile photo of user {response.user.id}: {e}")
 
-            user_profile["profile_photo_url"] = profile_photo_url 
-            print(user_profile)
-            user_profile_response = supabase.table("userprofile").insert(user_profile).execute()
             return {"message": "User Signed Up Successfully", "user_profile": user_profile_response.data[0]}
 
         if response.user and not response.session:
@@ -53,12 +64,24 @@ async def signup_user(user: UserSignup, profile_photo: Optional[UploadFile]):
         return {"error": str(e)}
     
 
-def signin_user(user: UserLogin):
+async def store_profile_photo(user_id: str, access_token: str, thumbnails: dict):
+    """
+        Background job that uploads a new user's photo thumbnails and points their profile at the small avatar variant.
+        Member lists and assignee payloads link to that variant, the other sizes sit next to it in storage.
+        The photos are uploaded and the profile updated with the new user's own token.
+    """
+    photo_urls = await upload_thumbnails(get_storage(access_token), user_id, thumbnails)
+    profile_response = await get_db(access_token).from_("userprofile").update({"profile_photo_url": photo_urls[AVATAR_SIZE]}).eq("id", user_id).execute()
+    if profile_response.data:
+        user_search_index.add(profile_response.data[0])
+    
+
+async def signin_user(user: UserLogin):
     """
         Signs in a user through Supabase and returns their user profile and session data which includes their JWT
     """
     try:
-        response = supabase.auth.sign_in_with_password(
+        response = await supabase.auth.sign_in_with_password(
             {
                 "email": user.email,
                 "password": user.password,
@@ -67,7 +90,7 @@ def signin_user(user: UserLogin):
 
         user_id = response.user.id 
 
-        user_response = supabase.table("userprofile").select("*").eq("id", user_id).single().execute()
+        user_response = await get_db(response.session.access_token).from_("userprofile").select("*").eq("id", user_id).single().execute()
 
 
         response_data = {
@@ -86,13 +109,25 @@ def signin_user(user: UserLogin):
     except Exception as e:
         return {"error": str(e)}
     
-def signout_user(jwt: str):
+async def signout_user(jwt: str):
     """
-        Signs out a user by invalidating their JWT
+        Signs out a user by invalidating their JWT.
+        The token is verified first, then evicted from the AuthContext cache and revoked so it stops working at once in this process.
     """
 
     try: 
-        supabase.auth.sign_out(jwt)
+        try:
+            #Runs in a worker thread because a JWKS refresh is a blocking HTTP call
+            claims = await run_in_threadpool(decode_token, jwt)
+            expires_at = float(claims["exp"])
+        except SigningKeyUnavailable:
+            response = await supabase.auth.get_user(jwt)
+            if not response.user:
+                return {"error": "Invalid token"}
+            expires_at = token_expiry(jwt)
+
+        auth_cache.revoke(jwt, expires_at)
+        await supabase.auth.admin.sign_out(jwt)
         return {"message": "User signed out"}
     except Exception as e:
         return {"error": str(e)}
\ No newline at end of file
@@ -0,0 +1,90 @@
+import jwt
+from datetime import datetime, timezone
+from gotrue.types import User
+from src.config import jwt_secret, jwt_audience, jwt_issuer, jwks_url, jwks_cache_seconds
+
+#Supabase signs with HS256 when using the legacy shared secret and with asymmetric keys when using JWT signing keys
+SYMMETRIC_ALGORITHMS = ["HS256"]
+ASYMMETRIC_ALGORITHMS = ["RS256", "ES256", "EdDSA"]
+
+_jwks_client = jwt.PyJWKClient(jwks_url, cache_keys=True, lifespan=jwks_cache_seconds) if jwks_url else None
+
+
+class SigningKeyUnavailable(Exception):
+    """
+        Raised when there is no local key material that can verify a token, so the caller should fall back to Supabase Auth
+    """
+    pass
+
+
+def _signing_key(token: str):
+    """
+        Picks the key used to verify the token based on the algorithm in its header.
+        JWKS keys are cached by the PyJWKClient so the key set is only fetched when it expires or a new key id shows up.
+    """
+    algorithm = jwt.get_unverified_header(token).get("alg")
+
+    if algorithm in SYMMETRIC_ALGORITHMS:
+        if not jwt_secret:
+            raise SigningKeyUnavailable("SUPABASE_JWT_SECRET is not configured")
+        return jwt_secret, SYMMETRIC_ALGORITHMS
+
+    if algorithm in ASYMMETRIC_ALGORITHMS:
+        if not _jwks_client:
+            raise SigningKeyUnavailable("No JWKS URL is configured")
+        try:
+            return _jwks_client.get_signing_key_from_jwt(token).key, ASYMMETRIC_ALGORITHMS
+        except jwt.PyJWKClientConnectionError as e:
+            raise SigningKeyUnavailable(str(e))
+
+    raise jwt.InvalidAlgorithmError(f"Unsupported token algorithm {algorithm}")
+
+
+def decode_token(token: str) -> dict:
+    """
+        Verifies the signature, expiry, audience and issuer of a Supabase JWT and returns its claims.
+        Raises a jwt.InvalidTokenError if the token is not valid.
+    """
+    key, algorithms = _signing_key(token)
+
+    return jwt.decode(
+        token,
+        key,
+        algorithms=algorithms,
+        audience=jwt_audience,
+        issuer=jwt_issuer,
+        options={"require": ["exp", "sub"]}
+    )
+
+
+def user_from_claims(claims: dict) -> User:
+    """
+        Builds the same User object Supabase Auth would return from the claims inside a verified JWT
+    """
+    audience = claims.get("aud") or jwt_audience
+    if isinstance(audience, list):
+        audience = audience[0]
+
+    issued_at = claims.get("iat")
+    created_at = datetime.fromtimestamp(issued_at, tz=timezone.utc) if issued_at else datetime.now(timezone.utc)
+
+    return User(
+        id=claims["sub"],
+        app_metadata=claims.get("app_metadata") or {},
+        user_metadata=claims.get("user_metadata") or {},
+        aud=audience,
+        email=claims.get("email"),
+        phone=claims.get("phone"),
+        role=claims.get("role"),
+        is_anonymous=claims.get("is_anonymous", False),
+        created_at=created_at
+    )
+
+
+def token_expiry(token: str) -> float:
+    """
+        Reads the exp claim of a token without verifying it.
+        Only use this on tokens that have already been verified.
+    """
+    claims = jwt.decode(token, options={"verify_signature": False})
+    return float(claims.get("exp", 0))
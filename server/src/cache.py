@@ -0,0 +1,176 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class CacheEntry:
+    """
+        One cached value, when it was loaded and the users it may be served to
+    """
+    def __init__(self, value):
+        self.value = value
+        self.authorized_users = set()
+        self.loaded_at = time.monotonic()
+
+
+class ProjectScopedCache:
+    """
+        Bounded LRU cache of values built from one user's view of a project, keyed by project ID.
+        RLS hides rows instead of raising, so a value is only served to users recorded as authorized for it, and other users have their access
+        to the project checked before it is shared with them. The write paths keep values up to date, the TTL only heals writes made by other processes.
+        Reads that may race with a write take a generation before reading and pass it to store, which skips values invalidated in the meantime.
+    """
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._invalidated_at = OrderedDict()
+        self._forgotten_generation = 0
+
+    def _removed(self, project_id: str, value):
+        """
+            Called whenever a value leaves the cache (invalidated, replaced, expired or evicted), for caches that keep secondary indexes
+        """
+        pass
+
+    def _entry(self, project_id) -> Optional[CacheEntry]:
+        """
+            Returns the live entry of a project, dropping it when it has expired
+        """
+        project_id = str(project_id)
+        entry = self._entries.get(project_id)
+        if entry and time.monotonic() - entry.loaded_at > self.ttl_seconds:
+            self._drop(project_id)
+            return None
+        return entry
+
+    def peek(self, project_id):
+        """
+            Returns the cached value for a project without checking who may read it, for the write paths
+        """
+        entry = self._entry(project_id)
+        return entry.value if entry else None
+
+    def get_authorized(self, project_id, user_id):
+        """
+            Returns the cached value if the user is already authorized to read it
+        """
+        entry = self._entry(project_id)
+        if entry is None or str(user_id) not in entry.authorized_users:
+            return None
+        self._entries.move_to_end(str(project_id))
+        return entry.value
+
+    async def get_visible(self, db, project_id, user_id):
+        """
+            Returns the cached value, checking once with the caller's client that they can see the project before it is shared with them
+        """
+        entry = self._entry(project_id)
+        if entry is None:
+            return None
+        if str(user_id) not in entry.authorized_users:
+            if not await project_visible(db, project_id):
+                return None
+            entry.authorized_users.add(str(user_id))
+        self._entries.move_to_end(str(project_id))
+        return entry.value
+
+    def generation(self) -> int:
+        """
+            Returns the current generation, taken before reading a value that will be passed to store or replace
+        """
+        return self._generation
+
+    def _changed_since(self, project_id, generation: int) -> bool:
+        """
+            Whether the project was invalidated after the generation was taken.
+            Projects whose invalidation has been forgotten count as changed if anything was invalidated after the generation
+        """
+        invalidated_at = self._invalidated_at.get(str(project_id), self._forgotten_generation)
+        return max(invalidated_at, self._forgotten_generation) > generation
+
+    def _bump(self, project_id: str):
+        """
+            Records that the project changed, so values read before now are not stored. Only the last max_size invalidations are remembered
+        """
+        self._generation += 1
+        self._invalidated_at[project_id] = self._generation
+        self._invalidated_at.move_to_end(project_id)
+        while len(self._invalidated_at) > self.max_size:
+            _, forgotten = self._invalidated_at.popitem(last=False)
+            self._forgotten_generation = max(self._forgotten_generation, forgotten)
+
+    def store(self, project_id, value, user_id=None, generation: Optional[int] = None):
+        """
+            Caches a value the user just built through RLS. Users authorized for the value it replaces stay authorized.
+            When the generation taken before the read is given, nothing is stored if the project was invalidated since
+        """
+        project_id = str(project_id)
+        if generation is not None and self._changed_since(project_id, generation):
+            return
+        old_entry = self._entry(project_id)
+        entry = CacheEntry(value)
+        if old_entry:
+            entry.authorized_users = old_entry.authorized_users
+            self._entries.pop(project_id)
+            self._removed(project_id, old_entry.value)
+        if user_id is not None:
+            entry.authorized_users.add(str(user_id))
+
+        self._entries[project_id] = entry
+        while len(self._entries) > self.max_size:
+            evicted_id, evicted = self._entries.popitem(last=False)
+            self._removed(evicted_id, evicted.value)
+
+    def replace(self, project_id, value, user_id, generation: int):
+        """
+            Caches a value the user just wrote, so reads still in flight can no longer store the older value.
+            If another write invalidated the project since the generation was taken, the order of the two is unknown and the value is dropped instead
+        """
+        project_id = str(project_id)
+        changed = self._changed_since(project_id, generation)
+        self._bump(project_id)
+        if changed:
+            self.invalidate(project_id)
+        else:
+            self.store(project_id, value, user_id)
+
+    def authorize(self, project_id, user_id):
+        """
+            Records that the user just read the project through RLS
+        """
+        entry = self._entry(project_id)
+        if entry:
+            entry.authorized_users.add(str(user_id))
+
+    def revoke(self, project_id, user_id):
+        """
+            Stops serving a project's value to a user, e.g. after they are removed from it
+        """
+        entry = self._entries.get(str(project_id))
+        if entry:
+            entry.authorized_users.discard(str(user_id))
+
+    def invalidate(self, project_id):
+        """
+            Drops a project's value so it is rebuilt on next use
+        """
+        self._bump(str(project_id))
+        self._drop(str(project_id))
+
+    def _drop(self, project_id: str):
+        """
+            Removes a project's value without recording a change, e.g. when it expires
+        """
+        entry = self._entries.pop(project_id, None)
+        if entry:
+            self._removed(project_id, entry.value)
+
+
+async def project_visible(db, project_id) -> bool:
+    """
+        Whether the caller's client can see the project through RLS
+    """
+    response = await db.from_("projects").select("id").eq("id", str(project_id)).execute()
+    return bool(response.data)
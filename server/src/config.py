@@ -4,4 +4,72 @@ from dotenv import load_dotenv
 load_dotenv()
 
 url: str = os.environ.get("SUPABASE_URL")
-key: str = os.environ.get("SUPABASE_KEY")
\ No newline at end of file
+key: str = os.environ.get("SUPABASE_KEY")
+#Service role key used by server-side jobs that must not depend on any user's session, e.g. building the user search index
+service_role_key: str = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+
+#JWT verification settings. "local" verifies tokens in-process and "remote" asks Supabase Auth on every request
+auth_verify_mode: str = os.environ.get("AUTH_VERIFY_MODE", "local")
+jwt_secret: str = os.environ.get("SUPABASE_JWT_SECRET")
+jwt_audience: str = os.environ.get("SUPABASE_JWT_AUDIENCE", "authenticated")
+jwt_issuer: str = os.environ.get("SUPABASE_JWT_ISSUER", f"{url}/auth/v1" if url else None)
+jwks_url: str = os.environ.get("SUPABASE_JWKS_URL", f"{url}/auth/v1/.well-known/jwks.json" if url else None)
+jwks_cache_seconds: int = int(os.environ.get("SUPABASE_JWKS_CACHE_SECONDS", "600"))
+
+#Maximum number of verified tokens kept in the in-process AuthContext cache
+auth_cache_size: int = int(os.environ.get("AUTH_CACHE_SIZE", "1024"))
+#Maximum number of logged out tokens remembered as revoked until they expire. Past it, the revocations closest to expiring are dropped first
+auth_revoked_size: int = int(os.environ.get("AUTH_REVOKED_SIZE", "10000"))
+
+#Shared HTTP connection pool used by the per-request PostgREST handles
+http_max_connections: int = int(os.environ.get("HTTP_MAX_CONNECTIONS", "100"))
+http_max_keepalive_connections: int = int(os.environ.get("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+http_keepalive_expiry: float = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY", "30"))
+http_timeout: float = float(os.environ.get("HTTP_TIMEOUT", "10"))
+http_connect_timeout: float = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "5"))
+http2_enabled: bool = os.environ.get("HTTP2_ENABLED", "true").lower() == "true"
+
+#Rows read per request by queries that must see every row. Must not exceed the PostgREST max-rows setting, which silently truncates larger results
+postgrest_page_size: int = int(os.environ.get("POSTGREST_PAGE_SIZE", "1000"))
+
+#In-process cache of per-project task dependency graphs
+dependency_graph_cache_size: int = int(os.environ.get("DEPENDENCY_GRAPH_CACHE_SIZE", "256"))
+dependency_graph_ttl_seconds: float = float(os.environ.get("DEPENDENCY_GRAPH_TTL_SECONDS", "300"))
+
+#In-process cache of per-project task rollup statistics
+project_stats_cache_size: int = int(os.environ.get("PROJECT_STATS_CACHE_SIZE", "1024"))
+project_stats_ttl_seconds: float = float(os.environ.get("PROJECT_STATS_TTL_SECONDS", "300"))
+
+#Read-through cache of project rows
+project_cache_size: int = int(os.environ.get("PROJECT_CACHE_SIZE", "2048"))
+project_cache_ttl_seconds: float = float(os.environ.get("PROJECT_CACHE_TTL_SECONDS", "60"))
+
+#In-process index of project memberships used for authorization and member listing
+membership_cache_size: int = int(os.environ.get("MEMBERSHIP_CACHE_SIZE", "2048"))
+membership_ttl_seconds: float = float(os.environ.get("MEMBERSHIP_TTL_SECONDS", "300"))
+
+#User search backend. "index" uses the in-process trigram/prefix index and "trgm" uses the search_userprofiles pg_trgm function
+user_search_mode: str = os.environ.get("USER_SEARCH_MODE", "index")
+user_search_refresh_seconds: float = float(os.environ.get("USER_SEARCH_REFRESH_SECONDS", "300"))
+
+#Per-resource version tokens used to build ETags for conditional GETs
+etag_cache_size: int = int(os.environ.get("ETAG_CACHE_SIZE", "10000"))
+etag_ttl_seconds: float = float(os.environ.get("ETAG_TTL_SECONDS", "300"))
+
+#Profile photo uploads: largest accepted file and the number of processes that decode and resize photos
+profile_photo_max_bytes: int = int(os.environ.get("PROFILE_PHOTO_MAX_BYTES", str(5 * 1024 * 1024)))
+photo_workers: int = int(os.environ.get("PHOTO_WORKERS", "2"))
+
+#In-process background job queue for work the caller does not wait for
+job_queue_size: int = int(os.environ.get("JOB_QUEUE_SIZE", "1000"))
+job_workers: int = int(os.environ.get("JOB_WORKERS", "4"))
+job_max_attempts: int = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+job_retry_backoff_seconds: float = float(os.environ.get("JOB_RETRY_BACKOFF_SECONDS", "0.5"))
+job_drain_timeout_seconds: float = float(os.environ.get("JOB_DRAIN_TIMEOUT_SECONDS", "30"))
+
+#Bearer token required to scrape /metrics. Leave unset to expose the metrics without authentication
+metrics_token: str = os.environ.get("METRICS_TOKEN", "")
+
+#Per-request upstream query tracing (also switchable at runtime through /debug/query-trace, which is only served when METRICS_TOKEN is set)
+query_trace_enabled: bool = os.environ.get("QUERY_TRACE_ENABLED", "false").lower() == "true"
+query_trace_repeat_threshold: int = int(os.environ.get("QUERY_TRACE_REPEAT_THRESHOLD", "5"))
@@ -1,4 +1,124 @@
-from supabase import create_client, Client
-from src.config import url, key
+import importlib.util
+from typing import Optional
+import httpx
+from postgrest import AsyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS
+from storage3 import AsyncStorageClient
+from supabase import AsyncClient, AsyncClientOptions
+from src.metrics import InstrumentedTransport
+from src.config import (
+    url, key, service_role_key, http_max_connections, http_max_keepalive_connections, http_keepalive_expiry,
+    http_timeout, http_connect_timeout, http2_enabled, postgrest_page_size
+)
 
-supabase: Client = create_client(url, key)
+#Async client so upstream calls never block the event loop. It is only used for auth calls: every sign-in puts the new session's token on it,
+#so table and storage calls go through get_db and get_storage instead. Its HTTP client is instrumented so auth, storage and table calls show up in /metrics
+supabase: AsyncClient = AsyncClient(url, key, options=AsyncClientOptions(
+    httpx_client=httpx.AsyncClient(
+        transport=InstrumentedTransport(httpx.AsyncHTTPTransport()),
+        timeout=httpx.Timeout(http_timeout, connect=http_connect_timeout),
+        follow_redirects=True
+    )
+))
+
+#Keep-alive connection pool shared by every per-request PostgREST handle. It is opened and closed by the app lifespan
+_http_pool: Optional[httpx.AsyncClient] = None
+
+rest_url = f"{url}/rest/v1"
+storage_url = f"{url}/storage/v1/"
+
+#Maximum number of IDs sent in a single in_() filter so the request URL stays within PostgREST limits
+ID_BATCH_SIZE = 200
+
+
+def id_batches(ids: list):
+    """
+        Splits a list of IDs into chunks of ID_BATCH_SIZE
+    """
+    for start in range(0, len(ids), ID_BATCH_SIZE):
+        yield ids[start:start + ID_BATCH_SIZE]
+
+
+async def fetch_all(build_query) -> list:
+    """
+        Runs a select page by page and returns every row, since PostgREST cuts any single response off at max-rows without an error.
+        build_query must return a new query with a stable order (ending in a unique column) on every call.
+    """
+    rows = []
+    while True:
+        response = await build_query().range(len(rows), len(rows) + postgrest_page_size - 1).execute()
+        rows.extend(response.data)
+        if len(response.data) < postgrest_page_size:
+            return rows
+
+
+async def open_http_pool():
+    """
+        Creates the shared HTTP connection pool. HTTP/2 is used when the h2 package is installed.
+    """
+    global _http_pool
+    if _http_pool is not None:
+        return
+
+    #Every request on the pool is counted and timed per table and operation
+    transport = InstrumentedTransport(httpx.AsyncHTTPTransport(
+        http2=http2_enabled and importlib.util.find_spec("h2") is not None,
+        limits=httpx.Limits(
+            max_connections=http_max_connections,
+            max_keepalive_connections=http_max_keepalive_connections,
+            keepalive_expiry=http_keepalive_expiry
+        )
+    ))
+    _http_pool = httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(http_timeout, connect=http_connect_timeout),
+        follow_redirects=True
+    )
+
+
+async def close_http_pool():
+    """
+        Closes every connection in the shared HTTP connection pool
+    """
+    global _http_pool
+    if _http_pool is not None:
+        await _http_pool.aclose()
+        _http_pool = None
+
+
+def get_db(token: str) -> AsyncPostgrestClient:
+    """
+        Returns a lightweight PostgREST handle scoped to the caller's JWT.
+        Each handle carries its own auth header, so concurrent requests never share one, but all handles reuse the same connection pool.
+    """
+    if _http_pool is None:
+        raise RuntimeError("The HTTP connection pool has not been opened")
+
+    headers = {
+        **DEFAULT_POSTGREST_CLIENT_HEADERS,
+        "apikey": key,
+        "Authorization": f"Bearer {token}"
+    }
+    return AsyncPostgrestClient(rest_url, headers=headers, http_client=_http_pool)
+
+
+def get_storage(token: str) -> AsyncStorageClient:
+    """
+        Returns a Storage handle scoped to the caller's JWT, sharing the connection pool like get_db
+    """
+    if _http_pool is None:
+        raise RuntimeError("The HTTP connection pool has not been opened")
+
+    headers = {
+        "apikey": key,
+        "Authorization": f"Bearer {token}"
+    }
+    return AsyncStorageClient(storage_url, headers=headers, http_client=_http_pool)
+
+
+def get_service_db() -> AsyncPostgrestClient:
+    """
+        Returns a PostgREST handle that does not carry any user's session, for server-side work such as building the user search index.
+        It uses SUPABASE_SERVICE_ROLE_KEY when it is set and falls back to the anon key, so its RLS view never depends on who signed in last.
+    """
+    return get_db(service_role_key or key)
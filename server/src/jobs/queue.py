@@ -0,0 +1,180 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+from src.config import job_queue_size, job_workers, job_max_attempts, job_retry_backoff_seconds, job_drain_timeout_seconds
+
+#Number of recent jobs kept for the latency percentiles
+LATENCY_WINDOW = 1000
+
+
+class Job:
+    """
+        One unit of background work: a coroutine function and its arguments
+    """
+    def __init__(self, name: str, func: Callable[..., Awaitable], args: tuple, kwargs: dict):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+
+def _percentile(values: list, fraction: float) -> float:
+    """
+        Nearest-rank percentile of already sorted values (0 when there are none)
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class JobQueue:
+    """
+        Bounded asyncio queue drained by a fixed number of worker tasks, for side effects a request does not need to wait for.
+        Failed jobs are put back on the queue after an exponential backoff, so a waiting retry does not hold a worker.
+        Stopping the queue refuses new jobs and waits (up to drain_timeout) for the queued ones and the retries still waiting.
+    """
+    def __init__(self, max_size: int, workers: int, max_attempts: int, backoff_seconds: float, drain_timeout: float):
+        self.max_size = max_size
+        self.worker_count = workers
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.drain_timeout = drain_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers = []
+        self._retries = {}
+        self.accepting = False
+        self.running = 0
+        self.counters = {"enqueued": 0, "rejected": 0, "completed": 0, "failed": 0, "retried": 0}
+        self._wait_times = deque(maxlen=LATENCY_WINDOW)
+        self._run_times = deque(maxlen=LATENCY_WINDOW)
+
+    async def start(self):
+        """
+            Creates the queue and its workers. Called from the app lifespan on startup
+        """
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.worker_count)]
+        self.accepting = True
+
+    async def stop(self):
+        """
+            Stops accepting jobs, waits for the queued and running ones to finish, then stops the workers. Called from the app lifespan on shutdown
+        """
+        self.accepting = False
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=self.drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"Background jobs still queued after {self.drain_timeout}s, {self._queue.qsize() + len(self._retries)} dropped")
+        for handle in self._retries.values():
+            handle.cancel()
+        self._retries = {}
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    def enqueue(self, name: str, func: Callable[..., Awaitable], *args, **kwargs) -> bool:
+        """
+            Queues func(*args, **kwargs) to run in the background.
+            Returns False (and queues nothing) when the queue is full or not running, so the caller can fall back to running it inline
+        """
+        if not self.accepting or self._queue is None:
+            self.counters["rejected"] += 1
+            return False
+        try:
+            self._queue.put_nowait(Job(name, func, args, kwargs))
+        except asyncio.QueueFull:
+            self.counters["rejected"] += 1
+            return False
+        self.counters["enqueued"] += 1
+        return True
+
+    async def submit(self, name: str, func: Callable[..., Awaitable], *args, **kwargs):
+        """
+            Queues func to run in the background, or runs it now if the queue cannot take it
+        """
+        if not self.enqueue(name, func, *args, **kwargs):
+            await func(*args, **kwargs)
+
+    def _retry_later(self, job: Job, delay: float):
+        """
+            Puts a job back on the queue after delay seconds. The job is only marked done once it is back on the queue, so draining waits for it
+        """
+        self._retries[job] = asyncio.get_running_loop().call_later(delay, self._requeue, job, delay)
+
+    def _requeue(self, job: Job, delay: float):
+        """
+            Puts a job whose retry delay has passed back on the queue, waiting another delay if the queue is full
+        """
+        self._retries.pop(job, None)
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._retry_later(job, delay)
+            return
+        job.enqueued_at = time.monotonic()
+        self._queue.task_done()
+
+    async def _work(self):
+        """
+            Worker loop: runs queued jobs one at a time, scheduling failures to be retried with exponential backoff and jitter
+        """
+        while True:
+            job = await self._queue.get()
+            self._wait_times.append(time.monotonic() - job.enqueued_at)
+            self.running += 1
+            started_at = time.monotonic()
+            retrying = False
+            job.attempts += 1
+            try:
+                await job.func(*job.args, **job.kwargs)
+                self.counters["completed"] += 1
+            except Exception as e:
+                if job.attempts >= self.max_attempts:
+                    self.counters["failed"] += 1
+                    print(f"Background job {job.name} failed after {job.attempts} attempts: {e}")
+                else:
+                    self.counters["retried"] += 1
+                    delay = self.backoff_seconds * 2 ** (job.attempts - 1)
+                    self._retry_later(job, delay * random.uniform(0.5, 1.5))
+                    retrying = True
+            finally:
+                self._run_times.append(time.monotonic() - started_at)
+                self.running -= 1
+                if not retrying:
+                    self._queue.task_done()
+
+    def stats(self) -> dict:
+        """
+            Returns the queue depth, the retries waiting for their backoff, job counters and wait/run latency percentiles (in seconds) of recent jobs
+        """
+        wait_times = sorted(self._wait_times)
+        run_times = sorted(self._run_times)
+        return {
+            "depth": self._queue.qsize() if self._queue else 0,
+            "max_size": self.max_size,
+            "workers": len(self._workers),
+            "running": self.running,
+            "waiting_retry": len(self._retries),
+            **self.counters,
+            "wait_seconds": {"p50": _percentile(wait_times, 0.5), "p95": _percentile(wait_times, 0.95), "max": wait_times[-1] if wait_times else 0.0},
+            "run_seconds": {"p50": _percentile(run_times, 0.5), "p95": _percentile(run_times, 0.95), "max": run_times[-1] if run_times else 0.0}
+        }
+
+
+job_queue = JobQueue(
+    max_size=job_queue_size,
+    workers=job_workers,
+    max_attempts=job_max_attempts,
+    backoff_seconds=job_retry_backoff_seconds,
+    drain_timeout=job_drain_timeout_seconds
+)
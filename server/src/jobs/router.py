@@ -0,0 +1,14 @@
+from fastapi import APIRouter, status, Depends
+from src.operator_auth import operator_only
+from src.jobs.queue import job_queue
+
+jobs_router = APIRouter(
+    prefix="/jobs"
+)
+
+@jobs_router.get("/stats", status_code=status.HTTP_200_OK, dependencies=[Depends(operator_only)])
+async def get_job_queue_stats():
+    """
+        Returns the background job queue depth, job counters and wait/run latency percentiles
+    """
+    return job_queue.stats()
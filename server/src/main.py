@@ -1,11 +1,42 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from src.auth.router import auth_router 
 from src.projects.router import projects_router
 from src.tasks.router import tasks_router
 from src.users.router import users_router
+from src.jobs.router import jobs_router
+from src.jobs.queue import job_queue
+from src.database import open_http_pool, close_http_pool
+from src.pagination import NEXT_CURSOR_HEADER
+from src.versions import ETAG_HEADER
+from src.users.service import build_user_search_index
+from src.users.photos import close_photo_pool
+from src.metrics import MetricsMiddleware, metrics_endpoint, register_job_queue
+from src.tracing import QUERY_TRACE_HEADER, QueryTraceMiddleware, query_trace_endpoint
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+        Opens the shared upstream connection pool and starts the background job workers on startup.
+        On shutdown the queued jobs are drained before the pool and the photo worker processes are closed.
+    """
+    await open_http_pool()
+    await job_queue.start()
+    await build_user_search_index()
+    yield
+    await job_queue.stop()
+    await close_http_pool()
+    close_photo_pool()
+
+app = FastAPI(lifespan=lifespan)
+
+register_job_queue(job_queue)
+app.add_api_route("/metrics", metrics_endpoint, include_in_schema=False)
+app.add_api_route("/debug/query-trace", query_trace_endpoint, methods=["GET", "PUT"], include_in_schema=False)
+
+#Innermost, so the trace covers only the upstream calls made by the route itself
+app.add_middleware(QueryTraceMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -13,11 +44,16 @@ app.add_middleware(
     allow_credentials=True,  
     allow_methods=["*"],     
     allow_headers=["*"],     
+    expose_headers=[NEXT_CURSOR_HEADER, ETAG_HEADER, QUERY_TRACE_HEADER],
 )
 
+#Added last so it wraps CORS as well and times the whole request
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(auth_router)
 app.include_router(projects_router)
 app.include_router(tasks_router)
 app.include_router(users_router)
+app.include_router(jobs_router)
 
 
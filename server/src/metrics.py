@@ -0,0 +1,170 @@
+import re
+import time
+import httpx
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, REGISTRY
+from starlette.requests import Request
+from starlette.responses import Response
+from src.operator_auth import operator_authorized
+from src.tracing import query_tracer
+
+#Latency buckets (seconds) shared by the request and upstream histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUESTS = Counter(
+    "ergo_http_requests_total",
+    "HTTP requests handled, by route template, method and status code",
+    ["method", "route", "status"]
+)
+REQUEST_LATENCY = Histogram(
+    "ergo_http_request_duration_seconds",
+    "Time spent handling HTTP requests, by route template and method",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS
+)
+UPSTREAM_CALLS = Counter(
+    "ergo_upstream_requests_total",
+    "Requests sent to Supabase, by service (postgrest, auth, storage), table or endpoint, operation and status code",
+    ["service", "target", "operation", "status"]
+)
+UPSTREAM_LATENCY = Histogram(
+    "ergo_upstream_request_duration_seconds",
+    "Time spent waiting on Supabase, by service, table or endpoint and operation",
+    ["service", "target", "operation"],
+    buckets=LATENCY_BUCKETS
+)
+AUTH_LATENCY = Histogram(
+    "ergo_auth_verify_duration_seconds",
+    "Time spent verifying tokens that were not in the auth cache, by AUTH_VERIFY_MODE",
+    ["mode"],
+    buckets=LATENCY_BUCKETS
+)
+
+#PostgREST operations by HTTP method
+POSTGREST_OPERATIONS = {"GET": "select", "HEAD": "count", "POST": "insert", "PATCH": "update", "PUT": "upsert", "DELETE": "delete"}
+
+#Path segments that are IDs are replaced so they do not become label values
+_ID_SEGMENT = re.compile(r"^[0-9a-fA-F-]{16,}$|^\d+$")
+
+
+def upstream_labels(request: httpx.Request) -> tuple:
+    """
+        Classifies a Supabase request into (service, target, operation) labels, e.g. ("postgrest", "tasks", "update") or ("auth", "token", "post")
+    """
+    segments = [segment for segment in request.url.path.split("/") if segment]
+    method = request.method
+
+    if segments[:2] == ["rest", "v1"]:
+        if len(segments) > 3 and segments[2] == "rpc":
+            return "postgrest", segments[3], "rpc"
+        table = segments[2] if len(segments) > 2 else "root"
+        return "postgrest", table, POSTGREST_OPERATIONS.get(method, method.lower())
+
+    if segments[:2] == ["auth", "v1"]:
+        endpoint = "/".join("{id}" if _ID_SEGMENT.match(segment) else segment for segment in segments[2:4]) or "root"
+        return "auth", endpoint, method.lower()
+
+    if segments[:2] == ["storage", "v1"]:
+        #/storage/v1/object/<bucket>/<path> is reported per bucket, the object path is dropped
+        kind = segments[2] if len(segments) > 2 else "root"
+        bucket = segments[3] if kind == "object" and len(segments) > 3 else kind
+        return "storage", bucket, method.lower()
+
+    return "other", segments[0] if segments else "root", method.lower()
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """
+        httpx transport that counts and times every request sent through the transport it wraps.
+        Used for the shared PostgREST pool and the Supabase client, so every execute(), auth and storage call is accounted for
+    """
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        service, target, operation = upstream_labels(request)
+        started_at = time.perf_counter()
+        status = "error"
+        response = None
+        try:
+            response = await self._transport.handle_async_request(request)
+            status = str(response.status_code)
+            return response
+        finally:
+            duration = time.perf_counter() - started_at
+            UPSTREAM_LATENCY.labels(service, target, operation).observe(duration)
+            UPSTREAM_CALLS.labels(service, target, operation, status).inc()
+            if query_tracer.enabled:
+                query_tracer.record(service, target, operation, request, response, status, duration)
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class MetricsMiddleware:
+    """
+        ASGI middleware that records the count, status code and latency of every request by route template.
+        Requests that match no route are grouped under "unmatched" so unknown paths cannot create new label values
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.perf_counter()
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            REQUEST_LATENCY.labels(scope["method"], route_path).observe(time.perf_counter() - started_at)
+            REQUESTS.labels(scope["method"], route_path, status).inc()
+
+
+class JobQueueCollector:
+    """
+        Reports the background job queue's depth and counters at scrape time, so the queue itself does no extra work
+    """
+    def __init__(self, queue):
+        self.queue = queue
+
+    def collect(self):
+        stats = self.queue.stats()
+        yield GaugeMetricFamily("ergo_job_queue_depth", "Background jobs waiting to run", value=stats["depth"])
+        yield GaugeMetricFamily("ergo_job_queue_running", "Background jobs running", value=stats["running"])
+        jobs = CounterMetricFamily("ergo_jobs", "Background jobs by outcome", labels=["outcome"])
+        for outcome in ("enqueued", "rejected", "completed", "failed", "retried"):
+            jobs.add_metric([outcome], stats[outcome])
+        yield jobs
+        for kind in ("wait", "run"):
+            latency = GaugeMetricFamily(f"ergo_job_{kind}_seconds", f"Recent background job {kind} time percentiles", labels=["quantile"])
+            latency.add_metric(["0.5"], stats[f"{kind}_seconds"]["p50"])
+            latency.add_metric(["0.95"], stats[f"{kind}_seconds"]["p95"])
+            yield latency
+
+
+def register_job_queue(queue):
+    """
+        Adds the background job queue's metrics to /metrics
+    """
+    REGISTRY.register(JobQueueCollector(queue))
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    """
+        Serves every metric in the Prometheus text format. Requires METRICS_TOKEN as a bearer token when it is set
+    """
+    if not operator_authorized(request):
+        return Response(status_code=401)
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
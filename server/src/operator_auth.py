@@ -0,0 +1,23 @@
+import secrets
+from fastapi import HTTPException, status
+from starlette.requests import Request
+from src.config import metrics_token
+
+
+def operator_authorized(request: Request, required: bool = False) -> bool:
+    """
+        Whether the request carries METRICS_TOKEN as a bearer token, for the operator endpoints.
+        When no token is configured the request is let through unless required is set
+    """
+    if not metrics_token:
+        return not required
+    supplied = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+    return secrets.compare_digest(supplied.encode(), metrics_token.encode())
+
+
+def operator_only(request: Request):
+    """
+        Dependency for API routes that only operators may use: requires METRICS_TOKEN as a bearer token when it is set, like /metrics
+    """
+    if not operator_authorized(request):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid operator token")
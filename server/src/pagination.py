@@ -0,0 +1,136 @@
+import base64
+import json
+from typing import Optional
+from fastapi import HTTPException, Query, status
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+#Response header that carries the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(sort_keys: list, values: list) -> str:
+    """
+        Encodes the sort key names and the sort key values of the last row in a page into an opaque cursor
+    """
+    payload = {"sort": list(sort_keys), "after": values}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+        Decodes a cursor back into the sort key names and values it was built from
+    """
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Cursor could not be decoded: {e}")
+    if not isinstance(payload, dict) or not isinstance(payload.get("sort"), list) or not isinstance(payload.get("after"), list):
+        raise ValueError("Cursor must encode the sort keys and their values")
+    if len(payload["sort"]) != len(payload["after"]):
+        raise ValueError("Cursor must hold one value per sort key")
+    return payload["sort"], payload["after"]
+
+
+class PageParams:
+    """
+        Dependency that reads the limit and cursor query parameters of a paginated list endpoint.
+        When no limit is passed the endpoint returns every row like before.
+        Endpoints read the cursor values through after_for, which rejects cursors issued under another sort order.
+    """
+    def __init__(
+        self,
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = Query(None)
+    ):
+        self.limit = limit
+        self.cursor_sort = None
+        self._after = None
+
+        if cursor:
+            try:
+                self.cursor_sort, self._after = decode_cursor(cursor)
+            except ValueError:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Invalid cursor"
+                )
+            if self.limit is None:
+                self.limit = DEFAULT_PAGE_SIZE
+
+    def after_for(self, sort_keys: list) -> Optional[list]:
+        """
+            Returns the cursor values for a list sorted by these keys.
+            A cursor from a differently sorted list would apply the wrong keyset filter and skip or repeat rows, so it is rejected
+        """
+        if self._after is None:
+            return None
+        if self.cursor_sort != list(sort_keys):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cursor was issued for a different sort order"
+            )
+        return self._after
+
+
+def _quote(value) -> str:
+    """
+        Quotes a value for use inside a PostgREST logic tree so commas, dots and parentheses are kept literal
+    """
+    escaped = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+def _keyset_filter(sort_keys: list, after: list) -> str:
+    """
+        Builds the PostgREST expression for rows that sort strictly after the cursor, e.g.
+        (a, b) > (x, y) becomes a.gt.x,and(a.eq.x,b.gt.y)
+    """
+    clauses = []
+    for index, column in enumerate(sort_keys):
+        equal_parts = [f"{sort_keys[i]}.eq.{_quote(after[i])}" for i in range(index)]
+        greater_part = f"{column}.gt.{_quote(after[index])}"
+        if equal_parts:
+            clauses.append(f"and({','.join(equal_parts + [greater_part])})")
+        else:
+            clauses.append(greater_part)
+    return ",".join(clauses)
+
+
+def apply_keyset(query, sort_keys: list, limit: Optional[int] = None, after: Optional[list] = None):
+    """
+        Orders a PostgREST select by the sort keys and, when paginating, only fetches the rows of the requested page
+    """
+    for column in sort_keys:
+        query = query.order(column)
+
+    if after is not None:
+        if len(after) != len(sort_keys):
+            raise ValueError("Cursor does not match the sort order of this list")
+        if len(sort_keys) == 1:
+            query = query.gt(sort_keys[0], after[0])
+        else:
+            query = query.or_(_keyset_filter(sort_keys, after))
+
+    if limit is not None:
+        query = query.limit(limit)
+
+    return query
+
+
+def sort_key(row: dict, sort_keys: list) -> tuple:
+    """
+        Returns the sort key values of a row
+    """
+    return tuple(row[column] for column in sort_keys)
+
+
+def next_cursor(rows: list, sort_keys: list, limit: Optional[int]) -> Optional[str]:
+    """
+        Returns the cursor of the page after these rows, or None when this was the last page
+    """
+    if limit is None or len(rows) < limit:
+        return None
+    return encode_cursor(sort_keys, list(sort_key(rows[-1], sort_keys)))
@@ -0,0 +1,32 @@
+import copy
+from typing import Optional
+from src.cache import ProjectScopedCache
+from src.config import project_cache_size, project_cache_ttl_seconds
+
+
+class ProjectCache(ProjectScopedCache):
+    """
+        Read-through cache of project rows. Each row is only served to the users that have read it through RLS.
+    """
+    def get(self, project_id, user_id) -> Optional[dict]:
+        """
+            Returns a copy of the cached row if the user has already been authorized to read it
+        """
+        row = self.get_authorized(project_id, user_id)
+        return copy.deepcopy(row) if row is not None else None
+
+    def set(self, project_id, row: dict, user_id, generation: int):
+        """
+            Stores a row the user just read through RLS, keeping users authorized by earlier reads.
+            The row is skipped if the project was written or deleted since the generation was taken
+        """
+        self.store(project_id, copy.deepcopy(row), user_id, generation)
+
+    def written(self, project_id, row: dict, user_id, generation: int):
+        """
+            Stores a row the user just wrote, so reads that started before the write cannot put the old row back
+        """
+        self.replace(project_id, copy.deepcopy(row), user_id, generation)
+
+
+project_cache = ProjectCache(max_size=project_cache_size, ttl_seconds=project_cache_ttl_seconds)
@@ -0,0 +1,84 @@
+from fastapi import Depends, HTTPException, status
+from src.auth.dependencies import get_current_user, AuthContext
+from src.database import id_batches
+from src.projects.membership import project_memberships
+from src.tasks.graph import dependency_graphs
+from src.versions import resource_versions
+import asyncio
+import uuid
+
+
+async def _require_member(ctx: AuthContext, project_id: uuid.UUID) -> AuthContext:
+    """
+        Rejects callers that are not the owner or a member of the project.
+        Once the project's membership is indexed this check does not make any upstream call.
+    """
+    membership = await project_memberships.get(ctx.db, project_id)
+
+    if membership is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+
+    if not membership.is_member(str(ctx.user.id)):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You are not a member of this project"
+        )
+
+    return ctx
+
+async def project_member(proj_id: uuid.UUID, ctx: AuthContext = Depends(get_current_user)):
+    """
+        Dependency for project routes (/projects/{proj_id}/...) that only members may use
+    """
+    return await _require_member(ctx, proj_id)
+
+async def task_project_member(project_id: uuid.UUID, ctx: AuthContext = Depends(get_current_user)):
+    """
+        Dependency for project task routes (/projects/{project_id}/tasks...) that only members may use
+    """
+    return await _require_member(ctx, project_id)
+
+async def task_member(task_id: uuid.UUID, ctx: AuthContext = Depends(get_current_user)):
+    """
+        Dependency for task routes (/tasks/{task_id}...) that only members of the task's project may use.
+        A task never moves between projects, so its project is looked up once and remembered, after which the check is local.
+    """
+    project_id = resource_versions.project_of_task(task_id) or await dependency_graphs.task_project(ctx.db, task_id)
+
+    if project_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task not found"
+        )
+
+    resource_versions.remember_task(task_id, project_id)
+    return await _require_member(ctx, project_id)
+
+async def require_tasks_member(ctx: AuthContext, task_ids: list) -> AuthContext:
+    """
+        Rejects callers that are not a member of the project of every listed task, for routes that take many task IDs in their body.
+        Projects that are not known yet are looked up in batches. Tasks that cannot be found are left to the route, which reports them per task.
+    """
+    project_ids = set()
+    unknown = []
+    for task_id in dict.fromkeys(str(task_id) for task_id in task_ids):
+        project_id = resource_versions.project_of_task(task_id) or dependency_graphs.project_of(task_id)
+        if project_id:
+            project_ids.add(project_id)
+        else:
+            unknown.append(task_id)
+
+    responses = await asyncio.gather(*(
+        ctx.db.from_("tasks").select("id, project_id").in_("id", batch).execute()
+        for batch in id_batches(unknown)
+    ))
+    for response in responses:
+        for row in response.data:
+            resource_versions.remember_task(row["id"], row["project_id"])
+            project_ids.add(row["project_id"])
+
+    await asyncio.gather(*(_require_member(ctx, project_id) for project_id in project_ids))
+    return ctx
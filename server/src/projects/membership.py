@@ -0,0 +1,142 @@
+from typing import Optional
+from src.cache import ProjectScopedCache
+from src.config import membership_cache_size, membership_ttl_seconds
+
+
+class ProjectMembership:
+    """
+        The owner and members (with their roles and user profiles) of one project
+    """
+    def __init__(self, project_id: str, owner_id: Optional[str], member_rows: list):
+        self.project_id = project_id
+        self.owner_id = owner_id
+        self.roles = {}
+        self.profiles = {}
+
+        for row in member_rows:
+            self.roles[row["user_id"]] = row["role"]
+            self.profiles[row["user_id"]] = row.get("user")
+
+    def is_member(self, user_id: str) -> bool:
+        """
+            Whether the user owns or is a member of the project
+        """
+        return user_id == self.owner_id or user_id in self.roles
+
+    def has_profiles(self) -> bool:
+        """
+            Whether every member's profile is known, so the member list can be served without a query
+        """
+        return all(profile is not None for profile in self.profiles.values())
+
+    def member_rows(self) -> list:
+        """
+            Returns the members in the same shape as the project_members/userprofile join, ordered by user ID
+        """
+        return [
+            {"role": self.roles[user_id], "user_id": user_id, "user": self.profiles[user_id]}
+            for user_id in sorted(self.roles)
+        ]
+
+
+class MembershipIndex(ProjectScopedCache):
+    """
+        Index of project memberships, mapping projects to their members and roles and users to the indexed projects they belong to.
+        Projects are loaded lazily and kept up to date by the project and member write paths.
+        A membership is itself what authorizes a user, so entries are not shared through authorized users like the other project caches.
+    """
+    def __init__(self, max_size: int, ttl_seconds: float):
+        super().__init__(max_size, ttl_seconds)
+        self._user_projects = {}
+
+    def _removed(self, project_id: str, membership: ProjectMembership):
+        for user_id in list(membership.roles) + [membership.owner_id]:
+            self._user_projects.get(user_id, set()).discard(project_id)
+
+    def projects_of(self, user_id) -> set:
+        """
+            Returns the IDs of the indexed projects a user belongs to
+        """
+        return set(self._user_projects.get(str(user_id), ()))
+
+    def _store(self, membership: ProjectMembership):
+        """
+            Indexes a membership, replacing any older entry for the project
+        """
+        self.store(membership.project_id, membership)
+        for user_id in list(membership.roles) + [membership.owner_id]:
+            if user_id:
+                self._user_projects.setdefault(user_id, set()).add(membership.project_id)
+
+    async def load(self, db, project_id) -> Optional[ProjectMembership]:
+        """
+            Reads a project's owner and members with the caller's client, returning None if the caller cannot see the project.
+            Nothing is indexed for callers that cannot see the project because RLS hides rows instead of raising.
+        """
+        project_id = str(project_id)
+        project_res = await db.from_("projects").select("owner_id").eq("id", project_id).execute()
+        if not project_res.data:
+            return None
+
+        members_res = await db.from_("project_members").select("role, user_id, user:userprofile(*)").eq("project_id", project_id).execute()
+        membership = ProjectMembership(project_id, project_res.data[0]["owner_id"], members_res.data)
+        self._store(membership)
+        return membership
+
+    async def get(self, db, project_id) -> Optional[ProjectMembership]:
+        """
+            Returns the project's membership, loading it on a miss
+        """
+        membership = self.peek(project_id)
+        if membership is None:
+            return await self.load(db, project_id)
+        self._entries.move_to_end(membership.project_id)
+        return membership
+
+    async def role_of(self, db, project_id, user_id) -> Optional[str]:
+        """
+            Returns the user's role in the project, or None if they are not a member (or cannot see the project)
+        """
+        membership = await self.get(db, project_id)
+        if membership is None or not membership.is_member(str(user_id)):
+            return None
+        return membership.roles.get(str(user_id), "Owner")
+
+    def project_created(self, project_id, owner_id):
+        """
+            Indexes a new project, which has no members until its owner is added
+        """
+        self._store(ProjectMembership(str(project_id), str(owner_id), []))
+
+    def project_deleted(self, project_id):
+        """
+            Removes a project from the index
+        """
+        self.invalidate(project_id)
+
+    def member_added(self, project_id, user_id, role: str):
+        """
+            Adds a member to an indexed project. Their profile is loaded the next time the member list is read
+        """
+        membership = self.peek(project_id)
+        if membership:
+            membership.roles[str(user_id)] = role
+            membership.profiles[str(user_id)] = None
+            self._user_projects.setdefault(str(user_id), set()).add(membership.project_id)
+
+    def member_removed(self, project_id, user_id):
+        """
+            Removes a member from an indexed project
+        """
+        membership = self.peek(project_id)
+        if membership:
+            membership.roles.pop(str(user_id), None)
+            membership.profiles.pop(str(user_id), None)
+            if str(user_id) != membership.owner_id:
+                self._user_projects.get(str(user_id), set()).discard(membership.project_id)
+
+
+project_memberships = MembershipIndex(
+    max_size=membership_cache_size,
+    ttl_seconds=membership_ttl_seconds
+)
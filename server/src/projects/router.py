@@ -1,10 +1,14 @@
-from fastapi import APIRouter, status, HTTPException, Form, Depends
-from src.projects.schemas import CreateProject, GetProject, UpdateProject, ProjectMember, AddProjectMember
-from src.projects.service import create_project, get_project, update_project, delete_project, get_all_projects, add_member, delete_member, all_project_members
+from fastapi import APIRouter, status, HTTPException, Form, Depends, Request, Response
+from src.projects.schemas import CreateProject, GetProject, UpdateProject, ProjectMember, AddProjectMember, ProjectStats, PortfolioProject
+from src.projects.service import PROJECT_SORT_KEYS, MEMBER_SORT_KEYS, create_project, get_project, update_project, delete_project, get_all_projects, add_member, delete_member, all_project_members, get_project_stats, rebuild_project_stats, get_portfolio
 from src.auth.dependencies import get_current_user, AuthContext
+from src.projects.dependencies import project_member
+from src.pagination import PageParams, next_cursor, NEXT_CURSOR_HEADER
+from src.versions import resource_versions, etag_matches, not_modified, if_match_version, ETAG_HEADER
 from gotrue.types import User
 from pydantic import ValidationError
-from typing import Optional
+from typing import Optional, Literal
+import json
 import uuid
 from datetime import datetime
 
@@ -13,28 +17,36 @@ projects_router = APIRouter(
 )
 
 @projects_router.post("", status_code=status.HTTP_201_CREATED)
-def create_new_project(
+async def create_new_project(
     ctx: AuthContext = Depends(get_current_user),
     name: str = Form(...),
     description: str = Form(...),
-    budget: float = Form(...)
+    budget: float = Form(...),
+    members: Optional[str] = Form(None, description='JSON list of initial members, e.g. [{"user_id": "...", "role": "Member"}]')
 ):
     """
-        Create new project and assign creator as Owner
+        Create new project and assign creator as Owner, optionally with an initial list of members.
+        The project and its memberships are created together, so either all of them exist or none do.
     """
     try:
         project_info = CreateProject(
             name=name, 
             description=description,
             budget=budget,
+            members=json.loads(members) if members else []
         ) 
     except ValidationError as e:
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
             detail=e.errors() 
         )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail="members must be a JSON list"
+        )
     
-    created_project = create_project(db=ctx.db, proj_info=project_info, owner_id=ctx.user.id)
+    created_project = await create_project(db=ctx.db, proj_info=project_info, owner_id=ctx.user.id)
 
     if "error" in created_project:
         raise HTTPException(
@@ -42,38 +54,73 @@ def create_new_project(
             detail=created_project["error"]
         )
     
-    try:
-        owner_member = AddProjectMember(user_id=ctx.user.id, role="Owner")
-        add_member(db=ctx.db, proj_id=created_project["id"], member_to_add=owner_member)
-    except Exception as e:
-        print(f"Error adding owner as member: {e}")
-    
     return created_project
 
 @projects_router.get("", status_code=status.HTTP_200_OK)
-def get_all_user_projects(ctx: AuthContext = Depends(get_current_user)):
+async def get_all_user_projects(
+    request: Request,
+    response: Response,
+    sort: Literal["created_at", "name", "budget"] = "created_at",
+    page: PageParams = Depends(),
+    ctx: AuthContext = Depends(get_current_user)
+):
     """
-        Get all user projects
+        Get all user projects along with the user's role in each.
+        Pass a limit to page through the projects, the cursor of the next page is returned in the X-Next-Cursor header.
+        Send the returned ETag back in If-None-Match to get a 304 while the user's projects are unchanged.
     """
-    user_projects = get_all_projects(ctx.db, ctx.user.id)
+    #The user's own list version changes with their memberships, the shared one with any project edit
+    etag = resource_versions.etag([("user_projects", ctx.user.id), ("projects", "*")], request.url.query)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    user_projects = await get_all_projects(ctx.db, ctx.user.id, limit=page.limit, after=page.after_for(PROJECT_SORT_KEYS[sort]), sort_by=sort)
     
     if "error" in user_projects:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=user_projects["error"]
         )
+
+    response.headers[ETAG_HEADER] = etag
+
+    cursor = next_cursor(user_projects, PROJECT_SORT_KEYS[sort], page.limit)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
     
     return user_projects
 
+@projects_router.get("/portfolio", status_code=status.HTTP_200_OK, response_model=list[PortfolioProject])
+async def get_user_portfolio(ctx: AuthContext = Depends(get_current_user)):
+    """
+        Get all user projects with their task counts by status, overdue count, task budget vs expense and member count
+    """
+    portfolio = await get_portfolio(ctx.db, ctx.user.id)
+
+    if "error" in portfolio:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=portfolio["error"]
+        )
+
+    return portfolio
+
 @projects_router.get("/{proj_id}", status_code=status.HTTP_200_OK, response_model=GetProject)
-def get_user_project(
+async def get_user_project(
     proj_id: uuid.UUID,
-    ctx: AuthContext = Depends(get_current_user)
+    request: Request,
+    response: Response,
+    ctx: AuthContext = Depends(project_member)
 ):
     """
-        Get a specific user project
+        Get a specific user project.
+        Send the returned ETag back in If-None-Match to get a 304 while the project is unchanged.
     """
-    user_project = get_project(ctx.db, proj_id)
+    etag = resource_versions.etag([("project", proj_id)])
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    user_project = await get_project(ctx.db, proj_id, ctx.user.id)
 
     if "error" in user_project:
         raise HTTPException(
@@ -81,19 +128,23 @@ def get_user_project(
             detail=user_project["error"]
         )
     
+    resource_versions.sent_row(etag, user_project.get("version"))
+    response.headers[ETAG_HEADER] = etag
     return user_project 
 
 @projects_router.put("/{proj_id}", status_code=status.HTTP_200_OK, response_model=GetProject)
-def update_user_project(
+async def update_user_project(
     proj_id: uuid.UUID,
     name: Optional[str] = Form(None), 
     description: Optional[str] = Form(None),
     budget: Optional[str] = Form(None),
     completed_at: Optional[str] = Form(None),
-    ctx: AuthContext = Depends(get_current_user)
+    expected_version: Optional[int] = Depends(if_match_version),
+    ctx: AuthContext = Depends(project_member)
 ):
     """
-        Update a specific user project
+        Update a specific user project.
+        Send the project's version or the ETag of its GET in If-Match to only update it if nobody else changed it since it was read (409 otherwise).
     """
     try:
         project_info = UpdateProject(
@@ -108,8 +159,13 @@ def update_user_project(
             detail=e.errors() 
         )
 
-    updated_project = update_project(ctx.db, proj_id, project_info)
+    updated_project = await update_project(ctx.db, proj_id, project_info, ctx.user.id, expected_version=expected_version)
 
+    if "conflict" in updated_project:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=updated_project
+        )
 
     if "error" in updated_project:
         raise HTTPException(
@@ -121,14 +177,14 @@ def update_user_project(
 
 
 @projects_router.delete("/{proj_id}", status_code=status.HTTP_200_OK)
-def delete_user_project(
+async def delete_user_project(
     proj_id: uuid.UUID,
-    ctx: AuthContext = Depends(get_current_user)
+    ctx: AuthContext = Depends(project_member)
 ):
     """
         Delete a specific user project
     """
-    delete_message = delete_project(ctx.db, proj_id)
+    delete_message = await delete_project(ctx.db, proj_id)
 
     if "error" in delete_message:
         raise HTTPException(
@@ -140,15 +196,15 @@ def delete_user_project(
 
 
 @projects_router.post("/{proj_id}/members", status_code=status.HTTP_201_CREATED)
-def add_project_member(
+async def add_project_member(
     proj_id: uuid.UUID, 
     member_to_add: AddProjectMember,
-    ctx: AuthContext = Depends(get_current_user)
+    ctx: AuthContext = Depends(project_member)
 ):
     """
         Adds a user to a project 
     """
-    add_message =  add_member(db=ctx.db, proj_id=proj_id, member_to_add=member_to_add)
+    add_message =  await add_member(db=ctx.db, proj_id=proj_id, member_to_add=member_to_add)
 
     if "error" in add_message:
         raise HTTPException(
@@ -160,15 +216,15 @@ def add_project_member(
 
 
 @projects_router.delete("/{proj_id}/members/{member_id}", status_code=status.HTTP_200_OK)
-def remove_project_member(
+async def remove_project_member(
     proj_id: uuid.UUID, 
     member_id: uuid.UUID,
-    ctx: AuthContext = Depends(get_current_user)
+    ctx: AuthContext = Depends(project_member)
 ):
     """
         Removes a user from a project
     """
-    delete_message = delete_member(db=ctx.db, proj_id=proj_id, member_id=member_id)
+    delete_message = await delete_member(db=ctx.db, proj_id=proj_id, member_id=member_id)
 
     if "error" in delete_message:
         raise HTTPException(
@@ -180,14 +236,17 @@ def remove_project_member(
 
 
 @projects_router.get("/{proj_id}/members", status_code=status.HTTP_200_OK, response_model=list[ProjectMember])
-def get_project_members(
+async def get_project_members(
     proj_id: uuid.UUID,
-    ctx: AuthContext = Depends(get_current_user)
+    response: Response,
+    page: PageParams = Depends(),
+    ctx: AuthContext = Depends(project_member)
 ):
     """
-        Gets all members in a project and their user profiles 
+        Gets all members in a project and their user profiles.
+        Pass a limit to page through the members, the cursor of the next page is returned in the X-Next-Cursor header.
     """
-    project_members = all_project_members(db=ctx.db, proj_id=proj_id) 
+    project_members = await all_project_members(db=ctx.db, proj_id=proj_id, limit=page.limit, after=page.after_for(MEMBER_SORT_KEYS)) 
 
     if "error" in project_members:
         raise HTTPException(
@@ -196,4 +255,46 @@ def get_project_members(
         )
     print(project_members)
 
+    cursor = next_cursor(project_members, MEMBER_SORT_KEYS, page.limit)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+
     return project_members
+
+
+@projects_router.get("/{proj_id}/stats", status_code=status.HTTP_200_OK, response_model=ProjectStats)
+async def get_user_project_stats(
+    proj_id: uuid.UUID,
+    ctx: AuthContext = Depends(project_member)
+):
+    """
+        Gets the budget, hours and status/priority totals of a project's tasks
+    """
+    project_stats = await get_project_stats(db=ctx.db, proj_id=proj_id, user_id=ctx.user.id)
+
+    if "error" in project_stats:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=project_stats["error"]
+        )
+
+    return project_stats
+
+
+@projects_router.post("/{proj_id}/stats/rebuild", status_code=status.HTTP_200_OK, response_model=ProjectStats)
+async def rebuild_user_project_stats(
+    proj_id: uuid.UUID,
+    ctx: AuthContext = Depends(project_member)
+):
+    """
+        Recomputes a project's task totals from scratch
+    """
+    project_stats = await rebuild_project_stats(db=ctx.db, proj_id=proj_id, user_id=ctx.user.id)
+
+    if "error" in project_stats:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=project_stats["error"]
+        )
+
+    return project_stats
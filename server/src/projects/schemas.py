@@ -1,7 +1,7 @@
 from pydantic import BaseModel, Field, field_validator
 import uuid
 from datetime import datetime
-from typing import Optional 
+from typing import Optional, List
 from src.users.schemas import PublicUserProfile
 
 class Project(BaseModel):
@@ -12,11 +12,6 @@ class Project(BaseModel):
     description: str = Field(..., max_length=500)
     budget: float = Field(..., ge=0)
 
-class CreateProject(Project):
-    """
-        The create project model follows the same model as the base task model
-    """
-    pass 
 
 class UpdateProject(BaseModel):
     """
@@ -44,6 +39,7 @@ class GetProject(Project):
     owner_id: uuid.UUID 
     created_at: datetime 
     completed_at: Optional[datetime] = None
+    version: Optional[int] = Field(None, description="Row version to send back in If-Match when updating the project")
 
     class Config:
         from_attributes = True
@@ -64,4 +60,37 @@ class AddProjectMember(BaseModel):
         The model that is used when adding a member to a project 
     """
     user_id: uuid.UUID 
-    role: str 
\ No newline at end of file
+    role: str
+
+class CreateProject(Project):
+    """
+        The create project model follows the same model as the base task model, plus the members to add besides the owner
+    """
+    members: List[AddProjectMember] = []
+
+class ProjectStats(BaseModel):
+    """
+        The model used when displaying the rollup totals of a project's tasks
+    """
+    project_id: uuid.UUID
+    task_count: int
+    budget: float
+    expense: float
+    remaining_budget: float
+    estimated_hours: float
+    actual_hours: float
+    by_status: dict[str, int]
+    by_priority: dict[str, int]
+
+class PortfolioProject(GetProject):
+    """
+        The model used when displaying a project with its task and member aggregates in the user's portfolio
+    """
+    role: str
+    task_count: int
+    completed_count: int
+    overdue_count: int
+    by_status: dict[str, int]
+    task_budget: float
+    task_expense: float
+    member_count: int
@@ -1,39 +1,78 @@
-from src.database import supabase
+from src.database import supabase, id_batches, fetch_all
 from src.projects.schemas import CreateProject, UpdateProject, AddProjectMember
+from src.pagination import apply_keyset, sort_key
+from src.projects.stats import project_stats
+from src.projects.cache import project_cache
+from src.projects.membership import project_memberships
+from src.tasks.graph import dependency_graphs
+from src.versions import resource_versions
+import asyncio
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
+from typing import Optional
+import numpy as np
 
-def create_project(db, proj_info: CreateProject, owner_id: uuid.UUID):
+#Stable keyset sort orders for paginating projects and project members
+PROJECT_SORT_KEYS = {
+    "created_at": ["created_at", "id"],
+    "name": ["name", "id"],
+    "budget": ["budget", "id"]
+}
+MEMBER_SORT_KEYS = ["user_id"]
+
+async def create_project(db, proj_info: CreateProject, owner_id: uuid.UUID):
     """
-        Creates a project using the user's inputted project information
+        Creates a project using the user's inputted project information.
+        The project, the owner's membership and any initial members are inserted together by the create_project_with_members function in one round trip.
     """
     try: 
-        new_proj = proj_info.model_dump()
-        new_proj["owner_id"] = str(owner_id)
-        response = db.from_("projects").insert(new_proj).execute()
-        return response.data[0]
+        response = await db.rpc("create_project_with_members", {
+            "project_name": proj_info.name,
+            "project_description": proj_info.description,
+            "project_budget": proj_info.budget,
+            "initial_members": [
+                {"user_id": str(member.user_id), "role": member.role}
+                for member in proj_info.members
+            ]
+        }).execute()
+        created_project = response.data
+
+        project_memberships.project_created(created_project["id"], owner_id)
+        for member in created_project["members"]:
+            project_memberships.member_added(created_project["id"], member["user_id"], member["role"])
+            resource_versions.bump(("user_projects", member["user_id"]))
+        return created_project
     except Exception as e:
         return {"error": str(e)}
 
 
-def get_project(db, proj_id: uuid.UUID):
+async def get_project(db, proj_id: uuid.UUID, user_id: uuid.UUID):
     """
-        Gets a specific user project information
+        Gets a specific user project information.
+        Rows are served from the project cache once the user has read them through RLS.
+        A read that overlaps a write or delete of the project is returned but not cached.
     """
     try:
-        response = db.from_("projects").select("*").eq("id", proj_id).single().execute()
+        cached_project = project_cache.get(proj_id, user_id)
+        if cached_project:
+            return cached_project
+
+        generation = project_cache.generation()
+        response = await db.from_("projects").select("*").eq("id", proj_id).single().execute()
+        project_cache.set(proj_id, response.data, user_id, generation)
         return response.data
     except Exception as e:
         return {"error": str(e)}
     
 
 
-def update_project(db, proj_id: uuid.UUID, upd_proj: UpdateProject):
+async def update_project(db, proj_id: uuid.UUID, upd_proj: UpdateProject, user_id: uuid.UUID, expected_version: Optional[int] = None):
     """
-        Updates a specific project's information
+        Updates a specific project's information, sending only the given columns.
+        When expected_version is given the update only applies if the project is still at that version, otherwise a conflict is returned.
     """
     try:
-        upd_project = upd_proj.model_dump(exclude_unset=True)
+        upd_project = upd_proj.model_dump(exclude_none=True)
         
         project_info = {}
         for key, value in upd_project.items():
@@ -42,62 +81,77 @@ def update_project(db, proj_id: uuid.UUID, upd_proj: UpdateProject):
             else:
                 project_info[key] = value 
         
-        update = db.from_("projects").update(project_info).eq("id", proj_id).execute()
+        if not project_info:
+            return await get_project(db, proj_id, user_id)
+
+        generation = project_cache.generation()
+        query = db.from_("projects").update(project_info).eq("id", proj_id)
+        if expected_version is not None:
+            query = query.eq("version", expected_version)
+        update = await query.execute()
         
         if not update.data:
+            project_cache.invalidate(proj_id)
+            if expected_version is not None:
+                current = await db.from_("projects").select("version").eq("id", proj_id).execute()
+                if current.data:
+                    return {"conflict": "Project was changed by someone else", "version": current.data[0]["version"]}
             return {"error": "Project not found or update failed"}
 
+        project_cache.written(proj_id, update.data[0], user_id, generation)
+        resource_versions.bump(("project", proj_id), ("projects", "*"))
         return update.data[0]
     except Exception as e:
         return {"error": str(e)}
 
-def delete_project(db, proj_id: uuid.UUID):
+async def delete_project(db, proj_id: uuid.UUID):
     """
         Deletes a project 
     """
     try:
-        response = db.from_("projects").delete().eq("id", proj_id).execute()
+        response = await db.from_("projects").delete().eq("id", proj_id).execute()
+        project_cache.invalidate(proj_id)
+        project_memberships.project_deleted(proj_id)
+        project_stats.invalidate(proj_id)
+        dependency_graphs.invalidate(proj_id)
+        resource_versions.drop(("project", proj_id), ("project_tasks", proj_id))
+        resource_versions.bump(("projects", "*"))
         return {"message": "Project Deleted Successfully"}
     except Exception as e:
         return {"error": str(e)}
 
-def get_all_projects(db, user_id: uuid.UUID):
+async def get_all_projects(db, user_id: uuid.UUID, limit: Optional[int] = None, after: Optional[list] = None, sort_by: str = "created_at"):
     """
-        Gets all projects a user is part of (either as owner or member)
+        Gets all projects a user is part of (either as owner or member) in one query, each with the user's role in it.
+        When a limit is given only that page of projects (after the cursor values) is returned.
     """
     try:
         user_id_str = str(user_id)
 
-        owned_response = db.from_("projects")\
-            .select("*")\
-            .eq("owner_id", user_id_str)\
-            .execute()
-        
-        owned_projects = owned_response.data if owned_response.data else []
+        #The embedded project_members list only holds the user's own membership row, so every project comes back once.
+        #Owners without a membership row are still matched through owner_id
+        query = db.from_("projects")\
+            .select("*, project_members(role)")\
+            .eq("project_members.user_id", user_id_str)\
+            .or_(f"owner_id.eq.{user_id_str},project_members.not.is.null")
 
-        member_response = db.from_("project_members")\
-            .select("projects(*)")\
-            .eq("user_id", user_id_str)\
-            .execute()
-        
-    
-        member_projects = []
-        if member_response.data:
-            for item in member_response.data:
-                if item.get('projects'): 
-                    member_projects.append(item['projects'])
+        response = await apply_keyset(query, PROJECT_SORT_KEYS[sort_by], limit, after).execute()
 
-        all_projects = owned_projects + member_projects
+        projects = []
+        for project in response.data:
+            membership = project.pop("project_members", None)
+            if membership:
+                project["role"] = membership[0]["role"]
+            else:
+                project["role"] = "Owner"
+            projects.append(project)
 
-      
-        unique_projects_map = {proj['id']: proj for proj in all_projects}
-        
-        return list(unique_projects_map.values())
+        return projects
 
     except Exception as e:
         return {"error": str(e)}
     
-def add_member(db, proj_id: uuid.UUID, member_to_add: AddProjectMember):
+async def add_member(db, proj_id: uuid.UUID, member_to_add: AddProjectMember):
     """
         Add a user to a project
     """
@@ -105,40 +159,148 @@ def add_member(db, proj_id: uuid.UUID, member_to_add: AddProjectMember):
         member_info = member_to_add.model_dump()
         member_info["user_id"] = str(member_info["user_id"])
         member_info["project_id"] = str(proj_id) 
-        add_response = db.from_("project_members").insert(member_info).execute()
+        add_response = await db.from_("project_members").insert(member_info).execute()
+        project_memberships.member_added(proj_id, member_info["user_id"], member_info["role"])
+        resource_versions.bump(("user_projects", member_info["user_id"]))
         return add_response.data 
     except Exception as e:
         return {"error": str(e)}
     
-def delete_member(db, proj_id: uuid.UUID, member_id: uuid.UUID):
+async def delete_member(db, proj_id: uuid.UUID, member_id: uuid.UUID):
     """
         Removes a user from a project
     """
     try: 
-        remove_response = (
+        remove_response = await (
             db.from_("project_members")
                     .delete()
                     .eq("project_id", proj_id)
                     .eq("user_id", member_id)
                     .execute()
         )
+        project_cache.revoke(proj_id, member_id)
+        project_stats.revoke(proj_id, member_id)
+        dependency_graphs.revoke(proj_id, member_id)
+        project_memberships.member_removed(proj_id, member_id)
+        resource_versions.revoke(("project_tasks", proj_id), member_id)
+        resource_versions.bump(("user_projects", member_id))
         return {"message": "User removed from project"}
     except Exception as e:
         return {"error": str(e)}
 
-def all_project_members(db, proj_id: uuid.UUID):
+async def all_project_members(db, proj_id: uuid.UUID, limit: Optional[int] = None, after: Optional[list] = None):
     """
-        Gets all members in a project
+        Gets all members in a project, or one page of them when a limit is given.
+        Members are served from the membership index, which is only reloaded when it is cold or missing a member's profile.
     """
     try: 
-        #Performs a join with the userprofile table to get the user profile information 
-        all_response = (
-            db.from_("project_members")
-                    .select("role, user:userprofile(*)")
-                    .eq("project_id", proj_id)
-                    .execute()
-        )
-        return all_response.data 
+        membership = await project_memberships.get(db, proj_id)
+        if membership and not membership.has_profiles():
+            #Performs a join with the userprofile table to get the user profile information 
+            membership = await project_memberships.load(db, proj_id)
+        if membership is None:
+            return {"error": "Project not found"}
+
+        members = membership.member_rows()
+        if after is not None:
+            members = [member for member in members if sort_key(member, MEMBER_SORT_KEYS) > tuple(after)]
+        return members[:limit] if limit else members
 
     except Exception as e:
-        return {"error": str(e)}   
\ No newline at end of file
+        return {"error": str(e)}   
+
+async def get_project_stats(db, proj_id: uuid.UUID, user_id: uuid.UUID):
+    """
+        Gets the rollup totals of a project's tasks (budget vs expense, estimated vs actual hours and counts by status and priority)
+    """
+    try:
+        rollup = await project_stats.get(db, proj_id, user_id)
+        if rollup is None:
+            return {"error": "Project not found"}
+        return rollup.as_dict()
+    except Exception as e:
+        return {"error": str(e)}
+
+async def rebuild_project_stats(db, proj_id: uuid.UUID, user_id: uuid.UUID):
+    """
+        Recomputes a project's rollup totals from all of its tasks, repairing any drift in the cached totals
+    """
+    try:
+        rollup = await project_stats.rebuild(db, proj_id, user_id)
+        if rollup is None:
+            return {"error": "Project not found"}
+        return rollup.as_dict()
+    except Exception as e:
+        return {"error": str(e)}
+
+def _timestamp_seconds(value: Optional[str]) -> float:
+    """
+        Helper function to convert a PostgREST timestamp into epoch seconds (NaN when missing), treating timestamps without a timezone as UTC
+    """
+    if not value:
+        return np.nan
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+async def get_portfolio(db, user_id: uuid.UUID):
+    """
+        Gets every project a user owns or belongs to along with task counts by status, overdue count, task budget vs expense and member count.
+        Tasks and members for all projects are read in batched, paged in_() queries and aggregated with NumPy, never one query per project.
+    """
+    try:
+        projects = await get_all_projects(db, user_id)
+        if "error" in projects:
+            return projects
+        if not projects:
+            return []
+
+        project_ids = [project["id"] for project in projects]
+        project_index = {project_id: position for position, project_id in enumerate(project_ids)}
+
+        #Each batch is paged because a single response stops at PostgREST's max-rows
+        batch_queries = []
+        for batch in id_batches(project_ids):
+            batch_queries.append(fetch_all(lambda batch=batch: db.from_("tasks").select("id, project_id, status, budget, expense, due_date, completed_on").in_("project_id", batch).order("id")))
+            batch_queries.append(fetch_all(lambda batch=batch: db.from_("project_members").select("project_id, user_id").in_("project_id", batch).order("project_id").order("user_id")))
+        batch_results = await asyncio.gather(*batch_queries)
+
+        tasks = [row for rows in batch_results[0::2] for row in rows]
+        members = [row for rows in batch_results[1::2] for row in rows]
+
+        count = len(project_ids)
+        task_project = np.fromiter((project_index[task["project_id"]] for task in tasks), dtype=np.int64, count=len(tasks))
+        member_project = np.fromiter((project_index[member["project_id"]] for member in members), dtype=np.int64, count=len(members))
+        budget = np.fromiter((task["budget"] or 0 for task in tasks), dtype=np.float64, count=len(tasks))
+        expense = np.fromiter((task["expense"] or 0 for task in tasks), dtype=np.float64, count=len(tasks))
+        due = np.fromiter((_timestamp_seconds(task["due_date"]) for task in tasks), dtype=np.float64, count=len(tasks))
+        completed = np.fromiter((task["status"] == "Completed" or task["completed_on"] is not None for task in tasks), dtype=bool, count=len(tasks))
+
+        statuses, status_codes = np.unique(np.array([task["status"] or "" for task in tasks], dtype=object), return_inverse=True)
+        status_counts = np.bincount(task_project * len(statuses) + status_codes, minlength=count * len(statuses)).reshape(count, len(statuses))
+
+        overdue = ~completed & (due < datetime.now(timezone.utc).timestamp())
+
+        task_counts = np.bincount(task_project, minlength=count)
+        completed_counts = np.bincount(task_project[completed], minlength=count)
+        overdue_counts = np.bincount(task_project[overdue], minlength=count)
+        budget_totals = np.bincount(task_project, weights=budget, minlength=count)
+        expense_totals = np.bincount(task_project, weights=expense, minlength=count)
+        member_counts = np.bincount(member_project, minlength=count)
+
+        portfolio = []
+        for position, project in enumerate(projects):
+            portfolio.append({
+                **project,
+                "task_count": int(task_counts[position]),
+                "completed_count": int(completed_counts[position]),
+                "overdue_count": int(overdue_counts[position]),
+                "by_status": {str(statuses[code]): int(status_counts[position, code]) for code in np.flatnonzero(status_counts[position])},
+                "task_budget": float(budget_totals[position]),
+                "task_expense": float(expense_totals[position]),
+                "member_count": int(member_counts[position])
+            })
+        return portfolio
+    except Exception as e:
+        return {"error": str(e)}
@@ -0,0 +1,144 @@
+from collections import Counter
+from typing import Optional
+from src.cache import ProjectScopedCache, project_visible
+from src.database import fetch_all
+from src.config import project_stats_cache_size, project_stats_ttl_seconds
+
+#Only the task columns that feed the rollup are read when it is rebuilt
+ROLLUP_COLUMNS = "project_id, budget, expense, estimated_completion_time, actual_completion_time, status, priority"
+ROLLUP_FIELDS = [column.strip() for column in ROLLUP_COLUMNS.split(",")]
+
+
+class ProjectRollup:
+    """
+        Running totals over the tasks of one project.
+        Tasks are added or subtracted as they change, so reading the totals does not depend on the number of tasks.
+        Each task's current contribution is kept, so an update can be applied as a delta without reading the old row.
+    """
+    def __init__(self, project_id: str, tasks: list):
+        self.project_id = project_id
+        self.task_count = 0
+        self.budget = 0.0
+        self.expense = 0.0
+        self.estimated_hours = 0.0
+        self.actual_hours = 0.0
+        self.by_status = Counter()
+        self.by_priority = Counter()
+        self.contributions = {}
+
+        for task in tasks:
+            self.add(task)
+
+    def add(self, task: dict):
+        """
+            Adds a task, replacing its earlier contribution if it is already counted
+        """
+        self.remove(task["id"])
+        contribution = {field: task.get(field) for field in ROLLUP_FIELDS}
+        self.contributions[task["id"]] = contribution
+        self.apply(contribution, 1)
+
+    def remove(self, task_id: str):
+        """
+            Subtracts a task's contribution if it is counted
+        """
+        contribution = self.contributions.pop(task_id, None)
+        if contribution:
+            self.apply(contribution, -1)
+
+    def apply(self, task: dict, sign: int):
+        """
+            Adds (sign=1) or removes (sign=-1) one task's contribution to the totals
+        """
+        self.task_count += sign
+        self.budget += sign * (task.get("budget") or 0)
+        self.expense += sign * (task.get("expense") or 0)
+        self.estimated_hours += sign * (task.get("estimated_completion_time") or 0)
+        self.actual_hours += sign * (task.get("actual_completion_time") or 0)
+
+        for counter, key in ((self.by_status, task.get("status")), (self.by_priority, task.get("priority"))):
+            counter[key] += sign
+            if counter[key] <= 0:
+                del counter[key]
+
+    def as_dict(self) -> dict:
+        """
+            Returns the totals in the shape of the ProjectStats schema
+        """
+        return {
+            "project_id": self.project_id,
+            "task_count": self.task_count,
+            "budget": self.budget,
+            "expense": self.expense,
+            "remaining_budget": self.budget - self.expense,
+            "estimated_hours": self.estimated_hours,
+            "actual_hours": self.actual_hours,
+            "by_status": {str(key): count for key, count in self.by_status.items()},
+            "by_priority": {str(key): count for key, count in self.by_priority.items()}
+        }
+
+
+class ProjectStatsCache(ProjectScopedCache):
+    """
+        Cache of ProjectRollups keyed by project ID, kept up to date by the task write paths.
+        Every task write records a change of its project, so a rebuild that read the tasks before the write does not cache its totals
+    """
+    async def rebuild(self, db, project_id, user_id) -> Optional[ProjectRollup]:
+        """
+            Recomputes a project's rollup from its tasks with the caller's client, returning None if the caller cannot see the project.
+            Visibility is checked first, which would otherwise cache empty totals. The rollup is not cached if a task was written while it was read.
+        """
+        project_id = str(project_id)
+        generation = self.generation()
+        if not await project_visible(db, project_id):
+            return None
+
+        tasks = await fetch_all(lambda: db.from_("tasks").select(f"id, {ROLLUP_COLUMNS}").eq("project_id", project_id).order("id"))
+        rollup = ProjectRollup(project_id, tasks)
+        self.store(project_id, rollup, user_id, generation)
+        return rollup
+
+    async def get(self, db, project_id, user_id) -> Optional[ProjectRollup]:
+        """
+            Returns the project's rollup, rebuilding it on a miss
+        """
+        if self.peek(project_id) is None:
+            return await self.rebuild(db, project_id, user_id)
+        return await self.get_visible(db, project_id, user_id)
+
+    def task_created(self, task: dict):
+        """
+            Adds a newly created task to its project's cached rollup
+        """
+        self._bump(str(task["project_id"]))
+        rollup = self.peek(task["project_id"])
+        if rollup:
+            rollup.add(task)
+
+    def task_updated(self, task: dict):
+        """
+            Replaces a task's old contribution with the updated row in the cached rollup.
+            A task the rollup does not know (e.g. created by another process) means the rollup is stale, so it is rebuilt on next use
+        """
+        self._bump(str(task["project_id"]))
+        rollup = self.peek(task["project_id"])
+        if rollup is None:
+            return
+        if task["id"] in rollup.contributions:
+            rollup.add(task)
+        else:
+            self.invalidate(task["project_id"])
+
+    def task_deleted(self, task: dict):
+        """
+            Removes a deleted task from its project's cached rollup
+        """
+        self._bump(str(task["project_id"]))
+        rollup = self.peek(task["project_id"])
+        if rollup:
+            rollup.remove(task["id"])
+
+project_stats = ProjectStatsCache(
+    max_size=project_stats_cache_size,
+    ttl_seconds=project_stats_ttl_seconds
+)
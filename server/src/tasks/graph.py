@@ -0,0 +1,296 @@
+import asyncio
+import weakref
+from collections import deque
+from typing import Optional
+from src.cache import ProjectScopedCache
+from src.database import fetch_all
+from src.config import dependency_graph_cache_size, dependency_graph_ttl_seconds
+
+
+class DependencyGraph:
+    """
+        Adjacency-list graph of the task dependencies in one project.
+        depends_on maps a task to the tasks it waits on and blocking maps a task to the tasks waiting on it.
+    """
+    def __init__(self, project_id: str, task_ids: list, edges: list):
+        self.project_id = project_id
+        self.depends_on = {}
+        self.blocking = {}
+
+        for task_id in task_ids:
+            self.add_task(task_id)
+        for task_id, depends_on_task_id in edges:
+            self.add_edge(task_id, depends_on_task_id)
+
+    def add_task(self, task_id: str):
+        """
+            Adds a task with no dependencies if it is not already in the graph
+        """
+        self.depends_on.setdefault(task_id, set())
+        self.blocking.setdefault(task_id, set())
+
+    def remove_task(self, task_id: str):
+        """
+            Removes a task and every dependency link that touches it
+        """
+        for depends_on_task_id in self.depends_on.pop(task_id, set()):
+            self.blocking[depends_on_task_id].discard(task_id)
+        for blocked_task_id in self.blocking.pop(task_id, set()):
+            self.depends_on[blocked_task_id].discard(task_id)
+
+    def add_edge(self, task_id: str, depends_on_task_id: str):
+        """
+            Records that task_id depends on depends_on_task_id
+        """
+        self.add_task(task_id)
+        self.add_task(depends_on_task_id)
+        self.depends_on[task_id].add(depends_on_task_id)
+        self.blocking[depends_on_task_id].add(task_id)
+
+    def remove_edge(self, task_id: str, depends_on_task_id: str):
+        """
+            Removes the link between task_id and depends_on_task_id
+        """
+        self.depends_on.get(task_id, set()).discard(depends_on_task_id)
+        self.blocking.get(depends_on_task_id, set()).discard(task_id)
+
+    def _reachable(self, start: str, adjacency: dict) -> list:
+        """
+            Breadth-first walk from a task, returning every task reached (excluding the start) in O(V+E)
+        """
+        seen = {start}
+        order = []
+        queue = deque([start])
+        while queue:
+            current = queue.popleft()
+            for neighbour in adjacency.get(current, ()):
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    order.append(neighbour)
+                    queue.append(neighbour)
+        return order
+
+    def upstream(self, task_id: str) -> list:
+        """
+            Every task this task transitively waits on
+        """
+        return self._reachable(task_id, self.depends_on)
+
+    def downstream(self, task_id: str) -> list:
+        """
+            Every task that transitively waits on this task
+        """
+        return self._reachable(task_id, self.blocking)
+
+    def would_create_cycle(self, task_id: str, depends_on_task_id: str) -> bool:
+        """
+            Making task_id depend on depends_on_task_id closes a cycle if depends_on_task_id already (transitively) waits on task_id
+        """
+        if task_id == depends_on_task_id:
+            return True
+        return task_id in self._reachable(depends_on_task_id, self.depends_on)
+
+    def validate_batch(self, added: list, removed: list) -> list:
+        """
+            Checks a batch of link changes as a whole: the removals are applied first, then each addition is checked against the graph including the earlier additions.
+            Returns one error per rejected change, including removals of tasks outside the project, and leaves the graph unchanged.
+        """
+        errors = []
+        applied_removals, applied_additions = [], []
+        try:
+            for task_id, depends_on_task_id in removed:
+                if task_id not in self.depends_on or depends_on_task_id not in self.depends_on:
+                    errors.append({"task_id": task_id, "depends_on_task_id": depends_on_task_id, "error": "Tasks must belong to the project"})
+                elif depends_on_task_id in self.depends_on[task_id]:
+                    self.remove_edge(task_id, depends_on_task_id)
+                    applied_removals.append((task_id, depends_on_task_id))
+
+            for task_id, depends_on_task_id in added:
+                error = None
+                if task_id not in self.depends_on or depends_on_task_id not in self.depends_on:
+                    error = "Tasks must belong to the project"
+                elif task_id == depends_on_task_id:
+                    error = "A task cannot depend on itself"
+                elif depends_on_task_id in self.depends_on[task_id]:
+                    error = "Dependency already exists"
+                elif self.would_create_cycle(task_id, depends_on_task_id):
+                    error = "Dependency would create a cycle"
+
+                if error:
+                    errors.append({"task_id": task_id, "depends_on_task_id": depends_on_task_id, "error": error})
+                else:
+                    self.add_edge(task_id, depends_on_task_id)
+                    applied_additions.append((task_id, depends_on_task_id))
+        finally:
+            for task_id, depends_on_task_id in applied_additions:
+                self.remove_edge(task_id, depends_on_task_id)
+            for task_id, depends_on_task_id in applied_removals:
+                self.add_edge(task_id, depends_on_task_id)
+
+        return errors
+
+    def topological_order(self) -> list:
+        """
+            Orders the tasks so every task comes after the tasks it depends on (Kahn's algorithm).
+            Raises a ValueError if the stored dependencies contain a cycle.
+        """
+        remaining = {task_id: len(deps) for task_id, deps in self.depends_on.items()}
+        queue = deque(task_id for task_id, count in remaining.items() if count == 0)
+        order = []
+
+        while queue:
+            current = queue.popleft()
+            order.append(current)
+            for blocked_task_id in self.blocking[current]:
+                remaining[blocked_task_id] -= 1
+                if remaining[blocked_task_id] == 0:
+                    queue.append(blocked_task_id)
+
+        if len(order) != len(remaining):
+            raise ValueError("Project dependencies contain a cycle")
+        return order
+
+
+class DependencyGraphCache(ProjectScopedCache):
+    """
+        Cache of DependencyGraphs keyed by project ID, each built in one round of queries and kept up to date by the task write paths.
+        Also maps the tasks of cached graphs to their projects, and hands out the per-project locks that serialize link writes.
+        Every task and link write records a change of its project, so a load that read the project before the write does not cache its graph.
+    """
+    def __init__(self, max_size: int, ttl_seconds: float):
+        super().__init__(max_size, ttl_seconds)
+        self._task_projects = {}
+        self._locks = weakref.WeakValueDictionary()
+
+    def _removed(self, project_id: str, graph: DependencyGraph):
+        for task_id in graph.depends_on:
+            if self._task_projects.get(task_id) == project_id:
+                del self._task_projects[task_id]
+
+    def project_of(self, task_id) -> Optional[str]:
+        """
+            Returns the project ID of a task that is part of a cached graph
+        """
+        return self._task_projects.get(str(task_id))
+
+    def lock(self, project_id) -> asyncio.Lock:
+        """
+            Returns the lock held while a project's links are checked against the graph and written, so two concurrent requests cannot each
+            add one half of a cycle. Locks are dropped once no request holds or waits on them.
+        """
+        project_id = str(project_id)
+        lock = self._locks.get(project_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[project_id] = lock
+        return lock
+
+    async def _load(self, db, project_id: str, user_id: str) -> Optional[DependencyGraph]:
+        """
+            Builds a project's graph with the caller's client, returning None if the caller cannot see the project.
+            Visibility is checked because RLS hides rows instead of raising, which would otherwise cache an empty graph.
+            The graph is returned but not cached if the project's tasks or links were written while it was read.
+        """
+        generation = self.generation()
+        project_res, tasks, edge_rows = await asyncio.gather(
+            db.from_("projects").select("id").eq("id", project_id).execute(),
+            fetch_all(lambda: db.from_("tasks").select("id").eq("project_id", project_id).order("created_at").order("id")),
+            fetch_all(lambda: db.from_("task_dependencies")
+                .select("task_id, depends_on_task_id, task:tasks!task_id!inner(project_id)")
+                .eq("task.project_id", project_id)
+                .order("task_id")
+                .order("depends_on_task_id"))
+        )
+
+        if not project_res.data:
+            return None
+
+        task_ids = [task["id"] for task in tasks]
+        edges = [(edge["task_id"], edge["depends_on_task_id"]) for edge in edge_rows]
+        graph = DependencyGraph(project_id, task_ids, edges)
+
+        self.store(project_id, graph, user_id, generation)
+        if self.peek(project_id) is graph:
+            for task_id in graph.depends_on:
+                self._task_projects[task_id] = project_id
+        return graph
+
+    async def get(self, db, project_id, user_id) -> Optional[DependencyGraph]:
+        """
+            Returns the project's graph, loading it on a miss
+        """
+        project_id = str(project_id)
+        if self.peek(project_id) is None:
+            return await self._load(db, project_id, str(user_id))
+        return await self.get_visible(db, project_id, user_id)
+
+    async def reload(self, db, project_id, user_id) -> Optional[DependencyGraph]:
+        """
+            Rebuilds a project's graph, e.g. when it is missing a task created by another process
+        """
+        return await self._load(db, str(project_id), str(user_id))
+
+    async def get_for_task(self, db, task_id, user_id) -> Optional[DependencyGraph]:
+        """
+            Returns the graph of the project a task belongs to, or None if the task cannot be found
+        """
+        project_id = await self.task_project(db, task_id)
+        if project_id is None:
+            return None
+        return await self.get(db, project_id, user_id)
+
+    async def task_project(self, db, task_id) -> Optional[str]:
+        """
+            Returns the project a task belongs to, from a cached graph or with the caller's client
+        """
+        project_id = self.project_of(task_id)
+        if project_id is None:
+            task_res = await db.from_("tasks").select("project_id").eq("id", str(task_id)).execute()
+            if not task_res.data:
+                return None
+            project_id = task_res.data[0]["project_id"]
+        return project_id
+
+    def task_created(self, project_id, task_id):
+        """
+            Adds a newly created task to its project's cached graph
+        """
+        self._bump(str(project_id))
+        graph = self.peek(project_id)
+        if graph:
+            graph.add_task(str(task_id))
+            self._task_projects[str(task_id)] = str(project_id)
+
+    def task_deleted(self, project_id, task_id):
+        """
+            Removes a deleted task and its links from its project's cached graph
+        """
+        self._bump(str(project_id))
+        self._task_projects.pop(str(task_id), None)
+        graph = self.peek(project_id)
+        if graph:
+            graph.remove_task(str(task_id))
+
+    def edge_added(self, project_id, task_id, depends_on_task_id):
+        """
+            Adds a newly inserted dependency link to its project's cached graph
+        """
+        self._bump(str(project_id))
+        graph = self.peek(project_id)
+        if graph:
+            graph.add_edge(str(task_id), str(depends_on_task_id))
+
+    def edge_removed(self, project_id, task_id, depends_on_task_id):
+        """
+            Removes a deleted dependency link from its project's cached graph
+        """
+        self._bump(str(project_id))
+        graph = self.peek(project_id)
+        if graph:
+            graph.remove_edge(str(task_id), str(depends_on_task_id))
+
+
+dependency_graphs = DependencyGraphCache(
+    max_size=dependency_graph_cache_size,
+    ttl_seconds=dependency_graph_ttl_seconds
+)
@@ -1,20 +1,25 @@
-from fastapi import APIRouter, HTTPException, Form, Depends
+from fastapi import APIRouter, HTTPException, Form, Body, Depends, Request, Response
 from fastapi import status as http_status
-from src.tasks.schemas import CreateTask, GetTask, UpdateTask
-from src.tasks.service import create_task, get_tasks_for_project, get_task, update_task, delete_task, add_dependency, remove_dependency, add_assignment, get_assignments, delete_assignment
+from fastapi.responses import StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from src.tasks.schemas import CreateTask, GetTask, UpdateTask, ProjectSchedule, BulkTaskResult, BulkUpdateTasks, BulkTaskUpdateResult, BulkDependencyChanges, BulkAssignmentChanges
+from src.tasks.service import TASK_SORT_KEYS, MAX_BULK_TASKS, create_task, create_tasks_bulk, get_tasks_for_project, stream_project_tasks, get_task, update_task, update_tasks_bulk, delete_task, add_dependency, remove_dependency, change_dependencies_bulk, change_assignments_bulk, get_task_order, get_dependency_chain, get_project_schedule, add_assignment, get_assignments, delete_assignment
 from src.auth.dependencies import get_current_user, AuthContext
+from src.projects.dependencies import task_project_member, task_member, require_tasks_member
+from src.pagination import PageParams, next_cursor, NEXT_CURSOR_HEADER
+from src.versions import resource_versions, etag_matches, not_modified, if_match_version, ETAG_HEADER
 from gotrue.types import User
 from pydantic import ValidationError, BaseModel
-from typing import Optional, List
+from typing import Optional, List, Literal
 from datetime import datetime
 import uuid
 
 tasks_router = APIRouter()
 
 @tasks_router.post("/projects/{project_id}/tasks", status_code=http_status.HTTP_201_CREATED, response_model=GetTask)
-def create_new_task(
+async def create_new_task(
     project_id: uuid.UUID,
-    ctx: AuthContext = Depends(get_current_user),
+    ctx: AuthContext = Depends(task_project_member),
     name: str = Form(...),
     description: str = Form(...),
     priority: str = Form(...),
@@ -36,7 +41,7 @@ def create_new_task(
     except ValidationError as e:
         raise HTTPException(status_code=http_status.HTTP_422_UNPROCESSABLE_ENTITY, detail=e.errors())
 
-    new_task = create_task(ctx.db, task_info, project_id, ctx.user.id)
+    new_task = await create_task(ctx.db, task_info, project_id, ctx.user.id)
 
 
     if "error" in new_task:
@@ -44,34 +49,145 @@ def create_new_task(
     
     return new_task
 
+@tasks_router.post("/projects/{project_id}/tasks/bulk", status_code=http_status.HTTP_201_CREATED, response_model=List[BulkTaskResult])
+async def create_tasks_in_bulk(
+    project_id: uuid.UUID,
+    response: Response,
+    tasks: List[dict] = Body(...),
+    ctx: AuthContext = Depends(task_project_member)
+):
+    """
+        Creates many tasks within the project from a JSON array of tasks.
+        Each task may have a temp_id, a depends_on list of temp_ids or existing task IDs and a list of assignee_ids.
+        Returns one result per task in the same order, holding either the created task or the reason it was not created.
+        The status is 201 when every task was created with its links, 207 when some items failed and 400 (with the results as detail) when none were created.
+    """
+    if len(tasks) > MAX_BULK_TASKS:
+        raise HTTPException(status_code=http_status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"At most {MAX_BULK_TASKS} tasks can be created per request")
+
+    results = await create_tasks_bulk(ctx.db, tasks, project_id, ctx.user.id)
+    if isinstance(results, dict) and "error" in results:
+        raise HTTPException(status_code=http_status.HTTP_400_BAD_REQUEST, detail=results["error"])
+
+    created = sum(1 for result in results if result["task"] is not None)
+    if results and created == 0:
+        raise HTTPException(status_code=http_status.HTTP_400_BAD_REQUEST, detail=jsonable_encoder(results))
+    if any(result["error"] for result in results):
+        response.status_code = http_status.HTTP_207_MULTI_STATUS
+
+    return results
+
 @tasks_router.get("/projects/{project_id}/tasks", status_code=http_status.HTTP_200_OK, response_model=List[GetTask])
-def get_all_tasks_for_project(
+async def get_all_tasks_for_project(
     project_id: uuid.UUID,
-    ctx: AuthContext = Depends(get_current_user)
+    request: Request,
+    response: Response,
+    sort: Literal["created_at", "due_date"] = "created_at",
+    page: PageParams = Depends(),
+    ctx: AuthContext = Depends(task_project_member)
 ):
     """
-        Gets information for all tasks in the project
+        Gets information for all tasks in the project.
+        Pass a limit to page through the tasks, the cursor of the next page is returned in the X-Next-Cursor header.
+        Send the returned ETag back in If-None-Match to get a 304 while the project's tasks are unchanged.
     """
-    tasks = get_tasks_for_project(ctx.db, project_id)
+    resources = [("project_tasks", project_id)]
+    etag = resource_versions.etag(resources, request.url.query)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    tasks = await get_tasks_for_project(ctx.db, project_id, limit=page.limit, after=page.after_for(TASK_SORT_KEYS[sort]), sort_by=sort)
     if isinstance(tasks, dict) and "error" in tasks:
         raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND, detail=tasks["error"])
+
+    resource_versions.authorize(resources, ctx.user.id)
+    response.headers[ETAG_HEADER] = etag
+
+    cursor = next_cursor(tasks, TASK_SORT_KEYS[sort], page.limit)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
     return tasks
 
+@tasks_router.get("/projects/{project_id}/tasks/export", status_code=http_status.HTTP_200_OK)
+async def export_project_tasks(
+    project_id: uuid.UUID,
+    ctx: AuthContext = Depends(task_project_member)
+):
+    """
+        Streams every task in the project as newline-delimited JSON, one GetTask object per line.
+        Tasks are read in batches so memory use stays constant and rows are sent before the whole project is read.
+    """
+    batches = stream_project_tasks(ctx.db, project_id)
+
+    #The first batch is read before streaming starts so upstream errors can still be returned as an HTTP error
+    try:
+        first_batch = await anext(batches, [])
+    except Exception as e:
+        raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND, detail=str(e))
+
+    async def ndjson_lines():
+        for task in first_batch:
+            yield GetTask.model_validate(task).model_dump_json() + "\n"
+        async for batch in batches:
+            for task in batch:
+                yield GetTask.model_validate(task).model_dump_json() + "\n"
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
 @tasks_router.get("/tasks/{task_id}", status_code=http_status.HTTP_200_OK, response_model=GetTask)
-def get_single_task(
+async def get_single_task(
     task_id: uuid.UUID,
-    ctx: AuthContext = Depends(get_current_user)
+    request: Request,
+    response: Response,
+    ctx: AuthContext = Depends(task_member)
 ):
     """
-        Gets information for a single task 
+        Gets information for a single task.
+        Send the returned ETag back in If-None-Match to get a 304 while the tasks of its project are unchanged.
     """
-    task = get_task(ctx.db, task_id)
+    #The ETag is only known before the read once this task's project is known, otherwise a concurrent write could be missed
+    etag = None
+    project_id = resource_versions.project_of_task(task_id)
+    if project_id:
+        resources = [("project_tasks", project_id)]
+        etag = resource_versions.etag(resources, str(task_id))
+        if etag_matches(request, etag) and resource_versions.is_authorized(resources, ctx.user.id):
+            return not_modified(etag)
+
+    task = await get_task(ctx.db, task_id)
     if isinstance(task, dict) and "error" in task:
         raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND, detail=task["error"])
+
+    resource_versions.authorize([("project_tasks", task["project_id"])], ctx.user.id)
+    if etag and task["project_id"] == project_id:
+        resource_versions.sent_row(etag, task.get("version"))
+        response.headers[ETAG_HEADER] = etag
     return task
 
+#Registered before /tasks/{task_id} so "bulk" is not read as a task ID
+@tasks_router.patch("/tasks/bulk", status_code=http_status.HTTP_200_OK, response_model=List[BulkTaskUpdateResult])
+async def update_tasks_in_bulk(
+    bulk_update: BulkUpdateTasks,
+    hydrate: bool = False,
+    ctx: AuthContext = Depends(get_current_user)
+):
+    """
+        Updates many tasks at once, either applying the same changes to every task in task_ids or per-task changes in updates.
+        Returns one result per task. Pass hydrate=true to also get each task's dependencies and assignees.
+        The caller must be a member of the project of every task (403 otherwise).
+    """
+    if len(bulk_update.task_ids) + len(bulk_update.updates) > MAX_BULK_TASKS:
+        raise HTTPException(status_code=http_status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"At most {MAX_BULK_TASKS} tasks can be updated per request")
+
+    await require_tasks_member(ctx, bulk_update.task_ids + [update.id for update in bulk_update.updates])
+    results = await update_tasks_bulk(ctx.db, bulk_update, hydrate=hydrate)
+    if isinstance(results, dict) and "error" in results:
+        raise HTTPException(status_code=http_status.HTTP_400_BAD_REQUEST, detail=results["error"])
+
+    return results
+
 @tasks_router.patch("/tasks/{task_id}", status_code=http_status.HTTP_200_OK, response_model=GetTask)
-def update_single_task(
+async def update_single_task(
     task_id: uuid.UUID,
     name: Optional[str] = Form(None),
     description: Optional[str] = Form(None),
@@ -83,10 +199,12 @@ def update_single_task(
     expense: Optional[str] = Form(None),
     due_date: Optional[str] = Form(None),
     completed_on: Optional[str] = Form(None),
-    ctx: AuthContext = Depends(get_current_user)
+    expected_version: Optional[int] = Depends(if_match_version),
+    ctx: AuthContext = Depends(task_member)
 ):
     """
-        Updates a task with the new details
+        Updates a task with the new details.
+        Send the task's version or the ETag of its GET in If-Match to only update it if nobody else changed it since it was read (409 otherwise).
     """
     try:
         task_update_info = UpdateTask(
@@ -99,20 +217,22 @@ def update_single_task(
     except ValidationError as e:
         raise HTTPException(status_code=http_status.HTTP_422_UNPROCESSABLE_ENTITY, detail=e.errors())
 
-    updated_task = update_task(ctx.db, task_id, task_update_info)
+    updated_task = await update_task(ctx.db, task_id, task_update_info, expected_version=expected_version)
+    if "conflict" in updated_task:
+        raise HTTPException(status_code=http_status.HTTP_409_CONFLICT, detail=updated_task)
     if "error" in updated_task:
         raise HTTPException(status_code=http_status.HTTP_400_BAD_REQUEST, detail=updated_task["error"])
     return updated_task
 
 @tasks_router.delete("/tasks/{task_id}", status_code=http_status.HTTP_200_OK)
-def delete_single_task(
+async def delete_single_task(
     task_id: uuid.UUID,
-    ctx: AuthContext = Depends(get_current_user)
+    ctx: AuthContext = Depends(task_member)
 ):
     """
         Deletes a task
     """
-    delete_message = delete_task(ctx.db, task_id)
+    delete_message = await delete_task(ctx.db, task_id)
     if "error" in delete_message:
         raise HTTPException(status_code=http_status.HTTP_400_BAD_REQUEST, detail=delete_message["error"])
     return delete_message
@@ -125,45 +245,122 @@ class DependencyRequest(BaseModel):
     depends_on_task_id: uuid.UUID
 
 @tasks_router.post("/tasks/{task_id}/dependencies", status_code=http_status.HTTP_201_CREATED)
-def add_task_dependency(
+async def add_task_dependency(
     task_id: uuid.UUID, 
     dependency: DependencyRequest,
-    ctx: AuthContext = Depends(get_current_user)
+    ctx: AuthContext = Depends(task_member)
 ):
     """
         Make a task dependent on another task.
     """
-    result = add_dependency(ctx.db, task_id, dependency.depends_on_task_id)
+    result = await add_dependency(ctx.db, task_id, dependency.depends_on_task_id, ctx.user.id)
     if "error" in result:
         raise HTTPException(status_code=http_status.HTTP_400_BAD_REQUEST, detail=result["error"])
     return {"message": "Dependency added successfully"}
 
 @tasks_router.delete("/tasks/{task_id}/dependencies/{depends_on_task_id}", status_code=http_status.HTTP_200_OK)
-def remove_task_dependency(
+async def remove_task_dependency(
     task_id: uuid.UUID, 
     depends_on_task_id: uuid.UUID,
-    ctx: AuthContext = Depends(get_current_user)
+    ctx: AuthContext = Depends(task_member)
 ):
     """
         Remove a dependency from a task.
     """
-    result = remove_dependency(ctx.db, task_id, depends_on_task_id)
+    result = await remove_dependency(ctx.db, task_id, depends_on_task_id)
     if "error" in result:
         raise HTTPException(status_code=http_status.HTTP_400_BAD_REQUEST, detail=result["error"])
     
     return result
 
 
+@tasks_router.post("/projects/{project_id}/dependencies/batch", status_code=http_status.HTTP_200_OK)
+async def change_project_dependencies(
+    project_id: uuid.UUID,
+    changes: BulkDependencyChanges,
+    ctx: AuthContext = Depends(task_project_member)
+):
+    """
+        Adds and removes many dependency links between the project's tasks in one request.
+        The batch is validated as a whole and rejected (nothing written) if any link is invalid or would create a cycle.
+    """
+    if len(changes.add) + len(changes.remove) > MAX_BULK_TASKS:
+        raise HTTPException(status_code=http_status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"At most {MAX_BULK_TASKS} links can be changed per request")
+
+    result = await change_dependencies_bulk(ctx.db, project_id, changes, ctx.user.id)
+    if "error" in result:
+        raise HTTPException(status_code=http_status.HTTP_400_BAD_REQUEST, detail=result["error"])
+    return result
+
+@tasks_router.post("/projects/{project_id}/assignments/batch", status_code=http_status.HTTP_200_OK)
+async def change_project_assignments(
+    project_id: uuid.UUID,
+    changes: BulkAssignmentChanges,
+    ctx: AuthContext = Depends(task_project_member)
+):
+    """
+        Adds and removes many task assignments within the project in one request
+    """
+    if len(changes.add) + len(changes.remove) > MAX_BULK_TASKS:
+        raise HTTPException(status_code=http_status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"At most {MAX_BULK_TASKS} assignments can be changed per request")
+
+    result = await change_assignments_bulk(ctx.db, project_id, changes, ctx.user.id)
+    if "error" in result:
+        raise HTTPException(status_code=http_status.HTTP_400_BAD_REQUEST, detail=result["error"])
+    return result
+
+@tasks_router.get("/projects/{project_id}/tasks/order", status_code=http_status.HTTP_200_OK)
+async def get_project_task_order(
+    project_id: uuid.UUID,
+    ctx: AuthContext = Depends(task_project_member)
+):
+    """
+        Gets the project's task IDs in dependency (topological) order
+    """
+    result = await get_task_order(ctx.db, project_id, ctx.user.id)
+    if "error" in result:
+        raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND, detail=result["error"])
+    return result
+
+@tasks_router.get("/projects/{project_id}/schedule", status_code=http_status.HTTP_200_OK, response_model=ProjectSchedule)
+async def get_project_task_schedule(
+    project_id: uuid.UUID,
+    start: Optional[datetime] = None,
+    ctx: AuthContext = Depends(task_project_member)
+):
+    """
+        Computes the critical path, earliest/latest start and finish and slack of every task in the project.
+        The schedule starts now unless a start time is given, and tasks that would finish after their due date are flagged as late.
+    """
+    result = await get_project_schedule(ctx.db, project_id, ctx.user.id, start)
+    if "error" in result:
+        raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND, detail=result["error"])
+    return result
+
+@tasks_router.get("/tasks/{task_id}/dependency-chain", status_code=http_status.HTTP_200_OK)
+async def get_task_dependency_chain(
+    task_id: uuid.UUID,
+    ctx: AuthContext = Depends(task_member)
+):
+    """
+        Gets every task that transitively blocks this task (upstream) and every task it transitively impacts (downstream)
+    """
+    result = await get_dependency_chain(ctx.db, task_id, ctx.user.id)
+    if "error" in result:
+        raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND, detail=result["error"])
+    return result
+
+
 @tasks_router.post("/tasks/{task_id}/assignees", status_code=http_status.HTTP_201_CREATED)
-def assign_user_task(
+async def assign_user_task(
     task_id: uuid.UUID, 
     assignee_id: uuid.UUID,
-    ctx: AuthContext = Depends(get_current_user)
+    ctx: AuthContext = Depends(task_member)
 ):
     """
         Assigns a task to a user in the project
     """
-    task_assignment = add_assignment(db=ctx.db, task_id=task_id, assignee_id=assignee_id)
+    task_assignment = await add_assignment(db=ctx.db, task_id=task_id, assignee_id=assignee_id)
 
     if "error" in task_assignment:
         raise HTTPException(status_code=http_status.HTTP_400_BAD_REQUEST, detail=task_assignment["error"])
@@ -172,14 +369,14 @@ def assign_user_task(
 
 
 @tasks_router.get("/tasks/{task_id}/assignees", status_code=http_status.HTTP_200_OK)
-def get_task_assignees(
+async def get_task_assignees(
     task_id: uuid.UUID, 
-    ctx: AuthContext = Depends(get_current_user)
+    ctx: AuthContext = Depends(task_member)
 ):
     """
         Gets all assignees for a single task 
     """
-    task_assignees = get_assignments(ctx.db, task_id=task_id)
+    task_assignees = await get_assignments(ctx.db, task_id=task_id)
 
     if "error" in task_assignees:
         raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND, detail=task_assignees["error"])
@@ -187,15 +384,15 @@ def get_task_assignees(
     return task_assignees 
 
 @tasks_router.delete("/tasks/{task_id}/assignees/{assignee_id}", status_code=http_status.HTTP_200_OK)
-def remove_user_assignment(
+async def remove_user_assignment(
     task_id: uuid.UUID, 
     assignee_id: uuid.UUID,
-    ctx: AuthContext = Depends(get_current_user)
+    ctx: AuthContext = Depends(task_member)
 ):
     """
         Unassigns a user from a task 
     """
-    delete_response = delete_assignment(db=ctx.db, task_id=task_id, assignee_id=assignee_id)
+    delete_response = await delete_assignment(db=ctx.db, task_id=task_id, assignee_id=assignee_id)
 
     if "error" in delete_response:
         raise HTTPException(status_code=http_status.HTTP_400_BAD_REQUEST, detail=delete_response["error"])
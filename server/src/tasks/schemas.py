@@ -1,7 +1,7 @@
 from pydantic import BaseModel, Field, field_validator
 import uuid
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Any
 from src.users.schemas import PublicUserProfile
 
 class TaskDependencyRead(BaseModel):
@@ -57,6 +57,22 @@ class UpdateTask(BaseModel):
         return val
     
 
+class BulkTaskUpdate(UpdateTask):
+    """
+        One task's changes in a bulk update request
+    """
+    id: uuid.UUID
+
+
+class BulkUpdateTasks(BaseModel):
+    """
+        A bulk update request: the same changes applied to every task in task_ids, and/or per-task changes in updates
+    """
+    task_ids: List[uuid.UUID] = []
+    changes: Optional[UpdateTask] = None
+    updates: List[BulkTaskUpdate] = []
+
+
 class TaskAssignee(BaseModel):
     user: PublicUserProfile
 
@@ -71,6 +87,7 @@ class GetTask(TaskBase):
     estimated_completion_time: Optional[int] = None
     actual_completion_time: Optional[int] = None
     completed_on: Optional[datetime] = None
+    version: Optional[int] = Field(None, description="Row version to send back in If-Match when updating the task")
     
     depends_on: List[TaskDependencyRead] = []  
     blocking: List[TaskDependencyRead] = []    
@@ -79,4 +96,93 @@ class GetTask(TaskBase):
 
     model_config = {
         "from_attributes": True
-    }
\ No newline at end of file
+    }
+
+
+class TaskSchedule(BaseModel):
+    """
+        The computed schedule of a single task. Times assume work starts at the schedule's start time
+    """
+    id: uuid.UUID
+    name: str
+    duration_hours: float
+    earliest_start: datetime
+    earliest_finish: datetime
+    latest_start: datetime
+    latest_finish: datetime
+    slack_hours: float
+    critical: bool
+    due_date: Optional[datetime] = None
+    late: bool
+
+
+class ProjectSchedule(BaseModel):
+    """
+        The critical path schedule of a project
+    """
+    project_id: uuid.UUID
+    start: datetime
+    finish: datetime
+    critical_path: List[uuid.UUID]
+    tasks: List[TaskSchedule]
+
+
+class BulkCreateTask(CreateTask):
+    """
+        One task of a bulk create request.
+        depends_on and the other items' temp_id let tasks in the same request depend on each other before they have real IDs
+    """
+    temp_id: Optional[str] = Field(None, min_length=1, max_length=100)
+    depends_on: List[str] = Field([], description="temp_ids of tasks in this request or IDs of existing tasks in the project")
+    assignee_ids: List[uuid.UUID] = []
+
+
+class BulkTaskResult(BaseModel):
+    """
+        The outcome of one item of a bulk request, in the same position as the item
+    """
+    index: int
+    temp_id: Optional[str] = None
+    task: Optional[GetTask] = None
+    error: Optional[Any] = None
+
+
+class BulkTaskUpdateResult(BaseModel):
+    """
+        The outcome of updating one task in a bulk update request
+    """
+    id: uuid.UUID
+    task: Optional[GetTask] = None
+    error: Optional[str] = None
+
+
+class DependencyLink(BaseModel):
+    """
+        A dependency link: task_id waits on depends_on_task_id
+    """
+    task_id: uuid.UUID
+    depends_on_task_id: uuid.UUID
+
+
+class AssignmentLink(BaseModel):
+    """
+        An assignment of a user to a task
+    """
+    task_id: uuid.UUID
+    user_id: uuid.UUID
+
+
+class BulkDependencyChanges(BaseModel):
+    """
+        Dependency links to add and remove in one request
+    """
+    add: List[DependencyLink] = []
+    remove: List[DependencyLink] = []
+
+
+class BulkAssignmentChanges(BaseModel):
+    """
+        Task assignments to add and remove in one request
+    """
+    add: List[AssignmentLink] = []
+    remove: List[AssignmentLink] = []
@@ -1,27 +1,79 @@
-from src.database import supabase
-from src.tasks.schemas import CreateTask, UpdateTask
+from src.database import supabase, id_batches, fetch_all, ID_BATCH_SIZE
+from src.tasks.schemas import CreateTask, UpdateTask, BulkCreateTask, BulkUpdateTasks, BulkDependencyChanges, BulkAssignmentChanges
+from src.pagination import apply_keyset, sort_key
+from src.tasks.graph import dependency_graphs
+from src.tasks.schedule import compute_schedule
+from src.projects.stats import project_stats
+from src.versions import resource_versions
 from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
+from typing import Optional
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import asyncio
+import json
 import uuid
 
-def _get_dependency_details(db, task_id: uuid.UUID):
+#Stable keyset sort orders for paginating a project's tasks
+TASK_SORT_KEYS = {
+    "created_at": ["created_at", "id"],
+    "due_date": ["due_date", "id"]
+}
+
+#Number of tasks read and hydrated per page when exporting a project
+EXPORT_BATCH_SIZE = ID_BATCH_SIZE
+
+#Largest number of items accepted by one bulk request and the number of rows sent per bulk insert
+MAX_BULK_TASKS = 5000
+BULK_INSERT_BATCH_SIZE = 500
+
+#Number of (task, other) pairs matched by one batched delete, which keeps the filter within URL length limits
+PAIR_DELETE_BATCH_SIZE = 100
+
+async def _fetch_task_links(db, task_ids: list):
     """
-        Helper function to fetch 'depends_on' and 'blocking' tasks for a given task.
+        Helper function to run the depends_on, blocking and assignee queries for a batch of task IDs concurrently.
+        Each query is read page by page, since a batch of tasks with many links can return more than max-rows rows.
     """
-    try:
-        depends_on_res = db.from_("task_dependencies").select("depends_on:tasks!depends_on_task_id(id, name, status)").eq("task_id", str(task_id)).execute()
-        
-        blocking_res = db.from_("task_dependencies").select("blocking:tasks!task_id(id, name, status)").eq("depends_on_task_id", str(task_id)).execute()
+    return await asyncio.gather(
+        fetch_all(lambda: db.from_("task_dependencies").select("task_id, depends_on:tasks!depends_on_task_id(id, name, status)").in_("task_id", task_ids)
+            .order("task_id").order("depends_on_task_id")),
+        fetch_all(lambda: db.from_("task_dependencies").select("depends_on_task_id, blocking:tasks!task_id(id, name, status)").in_("depends_on_task_id", task_ids)
+            .order("depends_on_task_id").order("task_id")),
+        fetch_all(lambda: db.from_("task_members").select("task_id, user:userprofile(*)").in_("task_id", task_ids).order("task_id").order("user_id"))
+    )
 
-        depends_on_list = [item["depends_on"] for item in depends_on_res.data]
-        blocking_list = [item["blocking"] for item in blocking_res.data]
-        
-        return depends_on_list, blocking_list
-    except Exception:
-        return [], []
+async def _hydrate_tasks(db, tasks: list):
+    """
+        Helper function to attach 'depends_on', 'blocking' and 'assignees' to a list of tasks.
+        Uses a constant number of batched queries per ID_BATCH_SIZE tasks instead of three queries per task.
+    """
+    task_ids = [task["id"] for task in tasks]
+    depends_on_map = {task_id: [] for task_id in task_ids}
+    blocking_map = {task_id: [] for task_id in task_ids}
+    assignees_map = {task_id: [] for task_id in task_ids}
 
+    batch_results = await asyncio.gather(*(_fetch_task_links(db, batch) for batch in id_batches(task_ids)))
 
+    for depends_on_rows, blocking_rows, assignee_rows in batch_results:
+        for item in depends_on_rows:
+            depends_on_map[item["task_id"]].append(item["depends_on"])
 
-def create_task(db, task_info: CreateTask, project_id: uuid.UUID, creator_id: uuid.UUID):
+        for item in blocking_rows:
+            blocking_map[item["depends_on_task_id"]].append(item["blocking"])
+
+        for item in assignee_rows:
+            assignees_map[item["task_id"]].append({"user": item["user"]})
+
+    for task in tasks:
+        task["depends_on"] = depends_on_map[task["id"]]
+        task["blocking"] = blocking_map[task["id"]]
+        task["assignees"] = assignees_map[task["id"]]
+
+    return tasks
+
+
+async def create_task(db, task_info: CreateTask, project_id: uuid.UUID, creator_id: uuid.UUID):
     """
         Creates a new task for a given project and user.
     """
@@ -30,114 +82,625 @@ def create_task(db, task_info: CreateTask, project_id: uuid.UUID, creator_id: uu
         new_task_data["project_id"] = str(project_id)
         new_task_data["created_by"] = str(creator_id)
 
-        response = db.from_("tasks").insert(jsonable_encoder(new_task_data)).execute()
+        response = await db.from_("tasks").insert(jsonable_encoder(new_task_data)).execute()
+        dependency_graphs.task_created(project_id, response.data[0]["id"])
+        project_stats.task_created(response.data[0])
+        resource_versions.task_changed(response.data[0]["id"], project_id)
         return response.data[0]
     except Exception as e:
         return {"error": str(e)}
 
-def get_tasks_for_project(db, project_id: uuid.UUID):
+def _validation_errors(e: ValidationError) -> list:
     """
-        Retrieves all tasks for a project, including their dependency details and who they are assigned to.
+        Helper function to turn a pydantic ValidationError into JSON serializable error details
+    """
+    return [{"loc": list(error["loc"]), "msg": error["msg"], "type": error["type"]} for error in e.errors()]
+
+def _is_uuid(value: str) -> bool:
+    """
+        Helper function to check a reference is a UUID before it is sent to PostgREST
     """
     try:
-        response = db.from_("tasks").select("*").eq("project_id", str(project_id)).execute()
-        tasks = response.data
+        uuid.UUID(value)
+        return True
+    except ValueError:
+        return False
 
-        for task in tasks:
-            task["depends_on"], task["blocking"] = _get_dependency_details(db, task["id"])
+async def _insert_batches(db, table: str, rows: list) -> list:
+    """
+        Helper function to insert rows BULK_INSERT_BATCH_SIZE at a time, all batches concurrently.
+        Returns (batch, response or exception) pairs so one failing batch does not hide the others.
+    """
+    batches = [rows[i:i + BULK_INSERT_BATCH_SIZE] for i in range(0, len(rows), BULK_INSERT_BATCH_SIZE)]
+    responses = await asyncio.gather(*(db.from_(table).insert(batch).execute() for batch in batches), return_exceptions=True)
+    return list(zip(batches, responses))
 
-            assignees_response = db.from_("task_members")\
-                .select("user:userprofile(*)")\
-                .eq("task_id", task["id"])\
-                .execute()
-            
-            task["assignees"] = assignees_response.data if assignees_response.data else []
+async def create_tasks_bulk(db, items: list, project_id: uuid.UUID, creator_id: uuid.UUID):
+    """
+        Creates many tasks in a project with a few batched inserts, returning one result (the task or an error) per item.
+        Items may depend on each other through their temp_id, and on existing tasks of the project through their ID.
+        Items that are invalid, reference unknown tasks or users, or are part of a dependency cycle are rejected along with the items that depend on them.
+    """
+    try:
+        project_id = str(project_id)
+        results = [
+            {"index": index, "temp_id": item.get("temp_id") if isinstance(item, dict) else None, "task": None, "error": None}
+            for index, item in enumerate(items)
+        ]
+
+        #Every item is validated up front so the inserts only carry valid tasks
+        valid = {}
+        temp_ids = {}
+        for index, item in enumerate(items):
+            try:
+                task = BulkCreateTask.model_validate(item)
+            except ValidationError as e:
+                results[index]["error"] = _validation_errors(e)
+                continue
+            if task.temp_id is not None and task.temp_id in temp_ids:
+                results[index]["error"] = f"Duplicate temp_id {task.temp_id}"
+                continue
+            if task.temp_id is not None:
+                temp_ids[task.temp_id] = index
+            valid[index] = task
+
+        rejected_temp_ids = {str(result["temp_id"]) for result in results if result["error"] and result["temp_id"] is not None} - set(temp_ids)
+
+        #Existing tasks and assignees referenced by the items are looked up in batched in_() queries
+        existing_refs = sorted({ref for task in valid.values() for ref in task.depends_on if ref not in temp_ids and _is_uuid(ref)})
+        assignee_refs = sorted({str(user_id) for task in valid.values() for user_id in task.assignee_ids})
+        task_lookups = [db.from_("tasks").select("id, name, status").eq("project_id", project_id).in_("id", batch).execute() for batch in id_batches(existing_refs)]
+        profile_lookups = [db.from_("userprofile").select("*").in_("id", batch).execute() for batch in id_batches(assignee_refs)]
+        lookups = await asyncio.gather(*task_lookups, *profile_lookups)
+        existing_tasks = {row["id"]: row for response in lookups[:len(task_lookups)] for row in response.data}
+        profiles = {row["id"]: row for response in lookups[len(task_lookups):] for row in response.data}
+
+        batch_deps = {}
+        for index, task in valid.items():
+            error = None
+            for ref in task.depends_on:
+                if ref == task.temp_id:
+                    error = "A task cannot depend on itself"
+                elif ref in rejected_temp_ids:
+                    error = f"Depends on {ref}, which could not be created"
+                elif ref not in temp_ids and ref not in existing_tasks:
+                    error = f"Unknown dependency {ref}"
+            for user_id in task.assignee_ids:
+                if str(user_id) not in profiles:
+                    error = f"Unknown assignee {user_id}"
+            if error:
+                results[index]["error"] = error
+            else:
+                batch_deps[index] = {temp_ids[ref] for ref in task.depends_on if ref in temp_ids}
+
+        #Kahn's algorithm over the links between items, anything left over is in or behind a cycle (or behind a rejected item)
+        dependents = {index: [] for index in batch_deps}
+        remaining = {}
+        for index, deps in batch_deps.items():
+            remaining[index] = len(deps)
+            for dep in deps:
+                if dep in dependents:
+                    dependents[dep].append(index)
+                else:
+                    remaining[index] = -1
+
+        order = [index for index, count in remaining.items() if count == 0]
+        for index in order:
+            for dependent in dependents[index]:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    order.append(dependent)
+
+        ordered = set(order)
+        for index in batch_deps:
+            if index not in ordered:
+                results[index]["error"] = "Depends on a task that could not be created or is part of a dependency cycle"
+
+        #IDs are assigned here because PostgREST does not promise to return inserted rows in the order they were sent
+        task_rows = []
+        index_of_id = {}
+        for index in order:
+            task_row = valid[index].model_dump(exclude={"temp_id", "depends_on", "assignee_ids"})
+            task_row["id"] = str(uuid.uuid4())
+            index_of_id[task_row["id"]] = index
+            task_row["project_id"] = project_id
+            task_row["created_by"] = str(creator_id)
+            task_rows.append(jsonable_encoder(task_row))
+
+        created = {}
+        for batch, response in await _insert_batches(db, "tasks", task_rows):
+            if isinstance(response, Exception):
+                for task_row in batch:
+                    results[index_of_id[task_row["id"]]]["error"] = str(response)
+                continue
+            for row in response.data:
+                created[index_of_id[str(row["id"])]] = row
+
+        for row in created.values():
+            dependency_graphs.task_created(project_id, row["id"])
+            project_stats.task_created(row)
+            resource_versions.remember_task(row["id"], project_id)
+        if created:
+            resource_versions.bump(("project_tasks", project_id))
+
+        def task_id_of(ref: str) -> Optional[str]:
+            if ref in temp_ids:
+                dep = created.get(temp_ids[ref])
+                return dep["id"] if dep else None
+            return ref
 
-        return tasks
+        dependency_rows, member_rows = [], []
+        link_owner = {}
+        for index, row in created.items():
+            for ref in valid[index].depends_on:
+                depends_on_task_id = task_id_of(ref)
+                if depends_on_task_id is None:
+                    results[index]["error"] = f"Task created without its dependency on {ref}, which could not be created"
+                    continue
+                dependency_rows.append({"task_id": row["id"], "depends_on_task_id": depends_on_task_id})
+                link_owner[("dependency", row["id"], depends_on_task_id)] = index
+            for user_id in valid[index].assignee_ids:
+                member_rows.append({"task_id": row["id"], "user_id": str(user_id)})
+                link_owner[("assignee", row["id"], str(user_id))] = index
+
+        dependency_results, member_results = await asyncio.gather(
+            _insert_batches(db, "task_dependencies", dependency_rows),
+            _insert_batches(db, "task_members", member_rows)
+        )
+
+        linked_dependencies, linked_members = [], []
+        for batch, response in dependency_results:
+            for link in batch:
+                if isinstance(response, Exception):
+                    results[link_owner[("dependency", link["task_id"], link["depends_on_task_id"])]]["error"] = f"Task created without its dependencies: {response}"
+                else:
+                    linked_dependencies.append(link)
+                    dependency_graphs.edge_added(project_id, link["task_id"], link["depends_on_task_id"])
+        for batch, response in member_results:
+            for link in batch:
+                if isinstance(response, Exception):
+                    results[link_owner[("assignee", link["task_id"], link["user_id"])]]["error"] = f"Task created without its assignees: {response}"
+                else:
+                    linked_members.append(link)
+
+        #The created tasks are hydrated from what is already known instead of being read back
+        summaries = {**existing_tasks, **{row["id"]: {"id": row["id"], "name": row["name"], "status": row["status"]} for row in created.values()}}
+        for row in created.values():
+            row["depends_on"], row["blocking"], row["assignees"] = [], [], []
+        created_by_id = {row["id"]: row for row in created.values()}
+        for link in linked_dependencies:
+            created_by_id[link["task_id"]]["depends_on"].append(summaries[link["depends_on_task_id"]])
+            if link["depends_on_task_id"] in created_by_id:
+                created_by_id[link["depends_on_task_id"]]["blocking"].append(summaries[link["task_id"]])
+        for link in linked_members:
+            created_by_id[link["task_id"]]["assignees"].append({"user": profiles[link["user_id"]]})
+
+        for index, row in created.items():
+            results[index]["task"] = row
+        return results
     except Exception as e:
         return {"error": str(e)}
 
-def get_task(db, task_id: uuid.UUID):
+async def get_tasks_for_project(db, project_id: uuid.UUID, limit: Optional[int] = None, after: Optional[list] = None, sort_by: str = "created_at"):
+    """
+        Retrieves the tasks for a project, including their dependency details and who they are assigned to.
+        When a limit is given only that page of tasks (after the cursor values) is fetched and hydrated.
+    """
+    try:
+        query = db.from_("tasks").select("*").eq("project_id", str(project_id))
+        response = await apply_keyset(query, TASK_SORT_KEYS[sort_by], limit, after).execute()
+        for task in response.data:
+            resource_versions.remember_task(task["id"], project_id)
+        return await _hydrate_tasks(db, response.data)
+    except Exception as e:
+        return {"error": str(e)}
+
+async def stream_project_tasks(db, project_id: uuid.UUID, batch_size: int = EXPORT_BATCH_SIZE):
+    """
+        Async generator that pages through a project's tasks in keyset order and yields each batch once its dependencies and assignees are attached.
+        Only one batch is held in memory at a time.
+    """
+    sort_keys = TASK_SORT_KEYS["created_at"]
+    after = None
+
+    while True:
+        query = db.from_("tasks").select("*").eq("project_id", str(project_id))
+        response = await apply_keyset(query, sort_keys, batch_size, after).execute()
+        tasks = response.data
+
+        if not tasks:
+            return
+
+        yield await _hydrate_tasks(db, tasks)
+
+        if len(tasks) < batch_size:
+            return
+        after = list(sort_key(tasks[-1], sort_keys))
+
+async def get_task(db, task_id: uuid.UUID):
     """
-        Retrieves a single task by its ID, including its dependency details.
+        Retrieves a single task by its ID, including its dependency details and assignees.
     """
     try:
-        response = db.from_("tasks").select("*").eq("id", str(task_id)).single().execute()
+        response = await db.from_("tasks").select("*").eq("id", str(task_id)).single().execute()
         task = response.data
 
         if task:
-            task["depends_on"], task["blocking"] = _get_dependency_details(db, task_id)
+            resource_versions.remember_task(task["id"], task["project_id"])
+            await _hydrate_tasks(db, [task])
         return task
     except Exception as e:
         return {"error": str(e)}
 
-def update_task(db, task_id: uuid.UUID, task_update: UpdateTask):
+async def update_task(db, task_id: uuid.UUID, task_update: UpdateTask, expected_version: Optional[int] = None):
     """
         Updates a task's information with the new user provided details.
+        Only the given columns are sent, in one request and without reading the task first.
+        When expected_version is given the update only applies if the task is still at that version, otherwise a conflict is returned.
     """
     try:
+        task_info = jsonable_encoder(task_update.model_dump(exclude_none=True))
+        if not task_info:
+            return await get_task(db, task_id)
 
-        old_task = get_task(db, task_id)
-
-        update_data = task_update.model_dump(exclude_unset=True)
-        if not update_data:
-            return old_task
-
-        task_info = {}
-        for key, value in update_data.items():
-            if value is not None:
-                task_info[key] = value 
-            else: 
-                task_info[key] = old_task[key]
-
-        response = db.from_("tasks").update(jsonable_encoder(task_info)).eq("id", str(task_id)).execute()
+        query = db.from_("tasks").update(task_info).eq("id", str(task_id))
+        if expected_version is not None:
+            query = query.eq("version", expected_version)
+        response = await query.execute()
         
         if not response.data:
+            if expected_version is not None:
+                current = await db.from_("tasks").select("version").eq("id", str(task_id)).execute()
+                if current.data:
+                    return {"conflict": "Task was changed by someone else", "version": current.data[0]["version"]}
             return {"error": "Task not found"}
+
+        updated_task = response.data[0]
+        project_stats.task_updated(updated_task)
+        resource_versions.task_changed(task_id, updated_task["project_id"])
             
-        return response.data[0]
+        return updated_task
+    except Exception as e:
+        return {"error": str(e)}
+
+async def update_tasks_bulk(db, bulk_update: BulkUpdateTasks, hydrate: bool = False):
+    """
+        Applies one set of changes to many tasks and/or per-task changes, returning one result (the updated task or an error) per task.
+        Tasks receiving identical changes share one batched update, so moving a sprint to "Done" is one request per ID_BATCH_SIZE tasks.
+        Only the changed columns are sent and tasks are not read first. Dependencies and assignees are only attached when hydrate is set.
+    """
+    try:
+        changes_by_task = {}
+        errors = {}
+        shared_changes = bulk_update.changes.model_dump(exclude_none=True) if bulk_update.changes else {}
+        requested = [(task_id, shared_changes) for task_id in bulk_update.task_ids]
+        requested += [(update.id, update.model_dump(exclude_none=True, exclude={"id"})) for update in bulk_update.updates]
+
+        for task_id, changes in requested:
+            task_id = str(task_id)
+            if task_id in changes_by_task or task_id in errors:
+                errors[task_id] = "Task listed more than once"
+                changes_by_task.pop(task_id, None)
+            elif not changes:
+                errors[task_id] = "No changes given for this task"
+            else:
+                changes_by_task[task_id] = jsonable_encoder(changes)
+
+        #Tasks with identical changes are grouped so each group is one update per ID batch
+        groups = {}
+        for task_id, changes in changes_by_task.items():
+            groups.setdefault(json.dumps(changes, sort_keys=True), []).append(task_id)
+
+        group_updates = [
+            (changes_key, batch)
+            for changes_key, task_ids in groups.items()
+            for batch in id_batches(task_ids)
+        ]
+        responses = await asyncio.gather(
+            *(db.from_("tasks").update(json.loads(changes_key)).in_("id", batch).execute() for changes_key, batch in group_updates),
+            return_exceptions=True
+        )
+
+        updated = {}
+        for (changes_key, batch), response in zip(group_updates, responses):
+            if isinstance(response, Exception):
+                for task_id in batch:
+                    errors[task_id] = str(response)
+                continue
+            for row in response.data:
+                updated[row["id"]] = row
+                project_stats.task_updated(row)
+            for task_id in batch:
+                if task_id not in updated:
+                    errors[task_id] = "Task not found"
+
+        for row in updated.values():
+            resource_versions.task_changed(row["id"], row["project_id"])
+
+        if hydrate and updated:
+            await _hydrate_tasks(db, list(updated.values()))
+
+        order = list(dict.fromkeys(str(task_id) for task_id, _ in requested))
+        return [
+            {"id": task_id, "task": updated.get(task_id), "error": errors.get(task_id)}
+            for task_id in order
+        ]
     except Exception as e:
         return {"error": str(e)}
 
-def delete_task(db, task_id: uuid.UUID):
+async def delete_task(db, task_id: uuid.UUID):
     """
         Deletes a task from the database.
     """
     try:
-        db.from_("tasks").delete().eq("id", str(task_id)).execute()
+        response = await db.from_("tasks").delete().eq("id", str(task_id)).execute()
+        for deleted_task in response.data:
+            dependency_graphs.task_deleted(deleted_task["project_id"], deleted_task["id"])
+            project_stats.task_deleted(deleted_task)
+            resource_versions.task_changed(deleted_task["id"], deleted_task["project_id"])
         return {"message": "Task deleted successfully"}
     except Exception as e:
         return {"error": str(e)}
 
 
 
-def add_dependency(db, task_id: uuid.UUID, depends_on_task_id: uuid.UUID):
+async def add_dependency(db, task_id: uuid.UUID, depends_on_task_id: uuid.UUID, user_id: uuid.UUID):
     """
         Creates a dependency link between two tasks.
+        The link is rejected if it is a self-dependency, crosses projects or would create a cycle.
+        The check and the insert run under the project's link lock, so concurrent requests cannot together close a cycle.
     """
     try:
-        response = db.from_("task_dependencies").insert({
-            "task_id": str(task_id),
-            "depends_on_task_id": str(depends_on_task_id)
-        }).execute()
+        task_id, depends_on_task_id = str(task_id), str(depends_on_task_id)
+        if task_id == depends_on_task_id:
+            return {"error": "A task cannot depend on itself"}
+
+        project_id = await dependency_graphs.task_project(db, task_id)
+        if project_id is None:
+            return {"error": "Task not found"}
+
+        async with dependency_graphs.lock(project_id):
+            graph = await dependency_graphs.get(db, project_id, user_id)
+            if graph is not None and (task_id not in graph.depends_on or depends_on_task_id not in graph.depends_on):
+                #Tasks created by another process are missing from the cached graph until it is reloaded
+                graph = await dependency_graphs.reload(db, project_id, user_id)
+            if graph is None or task_id not in graph.depends_on:
+                return {"error": "Task not found"}
+
+            if depends_on_task_id not in graph.depends_on:
+                return {"error": "Tasks must belong to the same project"}
+            if depends_on_task_id in graph.depends_on.get(task_id, ()):
+                return {"error": "Dependency already exists"}
+            if graph.would_create_cycle(task_id, depends_on_task_id):
+                return {"error": "Dependency would create a cycle"}
+
+            response = await db.from_("task_dependencies").insert({
+                "task_id": task_id,
+                "depends_on_task_id": depends_on_task_id
+            }).execute()
+            dependency_graphs.edge_added(project_id, task_id, depends_on_task_id)
+        resource_versions.task_changed(task_id, project_id)
         return response.data
     except Exception as e:
         return {"error": str(e)}
 
-def remove_dependency(db, task_id: uuid.UUID, depends_on_task_id: uuid.UUID):
+async def remove_dependency(db, task_id: uuid.UUID, depends_on_task_id: uuid.UUID):
     """
         Removes a dependency link between two tasks.
+        The delete runs under the project's link lock, so a concurrent add_dependency never checks against a graph that still has the link.
     """
     try:
-        db.from_("task_dependencies").delete().match({
-            "task_id": str(task_id),
-            "depends_on_task_id": str(depends_on_task_id)
-        }).execute()
+        project_id = await dependency_graphs.task_project(db, task_id)
+        if project_id is None:
+            return {"error": "Task not found"}
+
+        async with dependency_graphs.lock(project_id):
+            await db.from_("task_dependencies").delete().match({
+                "task_id": str(task_id),
+                "depends_on_task_id": str(depends_on_task_id)
+            }).execute()
+            dependency_graphs.edge_removed(project_id, task_id, depends_on_task_id)
+        resource_versions.task_changed(task_id, project_id)
         return {"message": "Dependency removed successfully"}
     except Exception as e:
         return {"error": str(e)}
+
+async def _delete_pairs(db, table: str, first_column: str, second_column: str, pairs: list) -> list:
+    """
+        Helper function to delete rows matching any of the (first, second) pairs, PAIR_DELETE_BATCH_SIZE pairs per request, all batches concurrently.
+        Returns the responses or exceptions of the batches
+    """
+    batches = [pairs[i:i + PAIR_DELETE_BATCH_SIZE] for i in range(0, len(pairs), PAIR_DELETE_BATCH_SIZE)]
+    return await asyncio.gather(
+        *(
+            db.from_(table).delete().or_(",".join(f"and({first_column}.eq.{first},{second_column}.eq.{second})" for first, second in batch)).execute()
+            for batch in batches
+        ),
+        return_exceptions=True
+    )
+
+def _batch_failures(responses: list) -> list:
+    """
+        Helper function to collect the errors of failed batches
+    """
+    return [str(response) for response in responses if isinstance(response, Exception)]
+
+async def change_dependencies_bulk(db, project_id: uuid.UUID, changes: BulkDependencyChanges, user_id: uuid.UUID):
+    """
+        Adds and removes many dependency links of a project with batched deletes and inserts.
+        The whole batch is checked against the project's graph first (removals applied before additions), and nothing is written if any change
+        touches a task outside the project or an addition is invalid or would create a cycle. Like add_dependency, the check and the writes run under the project's link lock.
+    """
+    try:
+        added = list(dict.fromkeys((str(link.task_id), str(link.depends_on_task_id)) for link in changes.add))
+        removed = list(dict.fromkeys((str(link.task_id), str(link.depends_on_task_id)) for link in changes.remove))
+
+        async with dependency_graphs.lock(project_id):
+            graph = await dependency_graphs.get(db, project_id, user_id)
+            if graph is None:
+                return {"error": "Project not found"}
+
+            errors = graph.validate_batch(added, removed)
+            if errors:
+                return {"error": errors}
+
+            #Removals go first so a batch can replace a link with another that is only valid once the old one is gone
+            failures = _batch_failures(await _delete_pairs(db, "task_dependencies", "task_id", "depends_on_task_id", removed))
+            if not failures:
+                rows = [{"task_id": task_id, "depends_on_task_id": depends_on_task_id} for task_id, depends_on_task_id in added]
+                failures = _batch_failures([response for _, response in await _insert_batches(db, "task_dependencies", rows)])
+
+            resource_versions.bump(("project_tasks", project_id))
+            if failures:
+                #Some batches may have been written, so the graph is reloaded instead of patched
+                dependency_graphs.invalidate(project_id)
+                return {"error": failures}
+
+            for task_id, depends_on_task_id in removed:
+                dependency_graphs.edge_removed(project_id, task_id, depends_on_task_id)
+            for task_id, depends_on_task_id in added:
+                dependency_graphs.edge_added(project_id, task_id, depends_on_task_id)
+        return {"added": len(added), "removed": len(removed)}
+    except Exception as e:
+        return {"error": str(e)}
+
+async def change_assignments_bulk(db, project_id: uuid.UUID, changes: BulkAssignmentChanges, user_id: uuid.UUID):
+    """
+        Adds and removes many task assignments of a project with batched deletes and inserts.
+        Every task must belong to the project, otherwise nothing is written.
+    """
+    try:
+        graph = await dependency_graphs.get(db, project_id, user_id)
+        if graph is None:
+            return {"error": "Project not found"}
+
+        added = list(dict.fromkeys((str(link.task_id), str(link.user_id)) for link in changes.add))
+        removed = list(dict.fromkeys((str(link.task_id), str(link.user_id)) for link in changes.remove))
+
+        errors = [
+            {"task_id": task_id, "user_id": assignee_id, "error": "Task must belong to the project"}
+            for task_id, assignee_id in added + removed
+            if task_id not in graph.depends_on
+        ]
+        if errors:
+            return {"error": errors}
+
+        failures = _batch_failures(await _delete_pairs(db, "task_members", "task_id", "user_id", removed))
+        if not failures:
+            rows = [{"task_id": task_id, "user_id": assignee_id} for task_id, assignee_id in added]
+            failures = _batch_failures([response for _, response in await _insert_batches(db, "task_members", rows)])
+
+        resource_versions.bump(("project_tasks", project_id))
+        if failures:
+            return {"error": failures}
+        return {"added": len(added), "removed": len(removed)}
+    except Exception as e:
+        return {"error": str(e)}
+
+async def get_task_order(db, project_id: uuid.UUID, user_id: uuid.UUID):
+    """
+        Returns the project's task IDs in topological order, each task after every task it depends on.
+    """
+    try:
+        graph = await dependency_graphs.get(db, project_id, user_id)
+        if graph is None:
+            return {"error": "Project not found"}
+        return {"project_id": str(project_id), "order": graph.topological_order()}
+    except Exception as e:
+        return {"error": str(e)}
+
+async def get_dependency_chain(db, task_id: uuid.UUID, user_id: uuid.UUID):
+    """
+        Returns the IDs of every task a task transitively waits on (upstream) and every task that transitively waits on it (downstream).
+    """
+    try:
+        graph = await dependency_graphs.get_for_task(db, task_id, user_id)
+        if graph is None:
+            return {"error": "Task not found"}
+        return {
+            "task_id": str(task_id),
+            "upstream": graph.upstream(str(task_id)),
+            "downstream": graph.downstream(str(task_id))
+        }
+    except Exception as e:
+        return {"error": str(e)}
+    
+def _parse_timestamp(value: str) -> datetime:
+    """
+        Helper function to parse a PostgREST timestamp, treating timestamps without a timezone as UTC
+    """
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+async def get_project_schedule(db, project_id: uuid.UUID, user_id: uuid.UUID, start: Optional[datetime] = None):
+    """
+        Computes the critical path schedule of a project: earliest and latest start and finish, slack and lateness for every task.
+        Durations come from estimated_completion_time (hours) and the links come from the cached dependency graph.
+    """
+    try:
+        graph, task_rows = await asyncio.gather(
+            dependency_graphs.get(db, project_id, user_id),
+            fetch_all(lambda: db.from_("tasks").select("id, name, estimated_completion_time, due_date").eq("project_id", str(project_id)).order("id"))
+        )
+        if graph is None:
+            return {"error": "Project not found"}
+
+        start = start or datetime.now(timezone.utc)
+        if start.tzinfo is None:
+            start = start.replace(tzinfo=timezone.utc)
+
+        tasks_by_id = {task["id"]: task for task in task_rows}
+        order = [task_id for task_id in graph.topological_order() if task_id in tasks_by_id]
+        index = {task_id: position for position, task_id in enumerate(order)}
+        tasks = [tasks_by_id[task_id] for task_id in order]
+
+        edges = [
+            (index[task_id], index[depends_on_task_id])
+            for task_id in order
+            for depends_on_task_id in graph.depends_on[task_id]
+            if depends_on_task_id in index
+        ]
+        durations = [task["estimated_completion_time"] or 0 for task in tasks]
+        schedule = compute_schedule(durations, edges)
+
+        due_dates = [_parse_timestamp(task["due_date"]) if task.get("due_date") else None for task in tasks]
+        due_hours = np.array([(due - start).total_seconds() / 3600 if due else np.nan for due in due_dates])
+        late = schedule["earliest_finish"] > due_hours
+
+        def at(hours) -> datetime:
+            return start + timedelta(hours=float(hours))
+
+        task_schedules = [
+            {
+                "id": task["id"],
+                "name": task["name"],
+                "duration_hours": durations[position],
+                "earliest_start": at(schedule["earliest_start"][position]),
+                "earliest_finish": at(schedule["earliest_finish"][position]),
+                "latest_start": at(schedule["latest_start"][position]),
+                "latest_finish": at(schedule["latest_finish"][position]),
+                "slack_hours": float(schedule["slack"][position]),
+                "critical": bool(schedule["critical"][position]),
+                "due_date": due_dates[position],
+                "late": bool(late[position])
+            }
+            for position, task in enumerate(tasks)
+        ]
+
+        critical_positions = np.flatnonzero(schedule["critical"])
+        critical_positions = critical_positions[np.argsort(schedule["earliest_start"][critical_positions], kind="stable")]
+
+        return {
+            "project_id": str(project_id),
+            "start": start,
+            "finish": at(schedule["project_finish"]),
+            "critical_path": [order[position] for position in critical_positions],
+            "tasks": task_schedules
+        }
+    except Exception as e:
+        return {"error": str(e)}
     
-def add_assignment(db, task_id: uuid.UUID, assignee_id: uuid.UUID):
+async def add_assignment(db, task_id: uuid.UUID, assignee_id: uuid.UUID):
     """
         Assigns a user to a task
     """
@@ -146,18 +709,19 @@ def add_assignment(db, task_id: uuid.UUID, assignee_id: uuid.UUID):
              "task_id": str(task_id),
              "user_id": str(assignee_id)
          }
-         assignment_response = db.from_("task_members").insert(assignment).execute()
+         assignment_response = await db.from_("task_members").insert(assignment).execute()
+         resource_versions.task_changed(task_id)
          return assignment_response.data
     except Exception as e:
         return {"error": str(e)}
     
 
-def get_assignments(db, task_id: uuid.UUID):
+async def get_assignments(db, task_id: uuid.UUID):
     """
         Gets all users assigned to a task along with their user profile
     """
     try:
-        assignments_response = (
+        assignments_response = await (
             db.from_("task_members")
                     .select("user:userprofile(*)")
                     .eq("task_id", task_id)
@@ -167,15 +731,16 @@ def get_assignments(db, task_id: uuid.UUID):
         return {"error": str(e)}   
     
 
-def delete_assignment(db, task_id: uuid.UUID, assignee_id: uuid.UUID):
+async def delete_assignment(db, task_id: uuid.UUID, assignee_id: uuid.UUID):
     """
         Removes a user assignment from a task
     """
     try:
-         remove_response = db.from_("task_members").delete().match({
+         remove_response = await db.from_("task_members").delete().match({
              "task_id": task_id,
              "user_id": assignee_id
          }).execute()
+         resource_versions.task_changed(task_id)
          return remove_response.data
     except Exception as e:
         return {"error": str(e)}
\ No newline at end of file
@@ -0,0 +1,155 @@
+import json
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+import httpx
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from src.config import query_trace_enabled, query_trace_repeat_threshold
+from src.operator_auth import operator_authorized
+
+#Response header that carries the query summary of a traced request
+QUERY_TRACE_HEADER = "X-Query-Trace"
+
+#Query parameters that shape the result rather than filter it
+_NON_FILTER_PARAMS = {"select", "order", "limit", "offset", "columns", "on_conflict"}
+
+
+class QueryTrace:
+    """
+        The upstream queries issued while handling one request
+    """
+    def __init__(self):
+        self.queries = []
+
+    def record(self, service: str, target: str, operation: str, request: httpx.Request, status: str, duration: float, rows: Optional[int]):
+        """
+            Adds one upstream query. Filters are kept as column=operator pairs, values are dropped
+        """
+        filters = []
+        for name, value in request.url.params.multi_items():
+            if name not in _NON_FILTER_PARAMS:
+                filters.append(f"{name}={value.split('.', 1)[0]}" if name not in ("or", "and") else name)
+
+        self.queries.append({
+            "service": service,
+            "target": target,
+            "operation": operation,
+            "filters": sorted(filters),
+            "select": request.url.params.get("select"),
+            "status": status,
+            "duration_ms": round(duration * 1000, 2),
+            "rows": rows
+        })
+
+    def repeated_shapes(self, threshold: int) -> list:
+        """
+            Returns (shape, count) for every query shape (target, operation and filter columns) issued at least threshold times, most repeated first
+        """
+        shapes = Counter(
+            f"{query['target']}:{query['operation']}({','.join(query['filters'])})"
+            for query in self.queries
+        )
+        return [(shape, count) for shape, count in shapes.most_common() if count >= threshold]
+
+    def summary(self, threshold: int) -> str:
+        """
+            One-line summary used as the X-Query-Trace header value
+        """
+        total_ms = sum(query["duration_ms"] for query in self.queries)
+        parts = [f"queries={len(self.queries)}", f"upstream_ms={total_ms:.1f}"]
+        repeated = self.repeated_shapes(threshold)
+        if repeated:
+            parts.append("n_plus_one=" + " ".join(f"{shape}x{count}" for shape, count in repeated))
+        return "; ".join(parts)
+
+
+class QueryTracer:
+    """
+        Runtime switch for query tracing. While it is off requests are not wrapped and upstream calls only check one attribute
+    """
+    def __init__(self, enabled: bool, repeat_threshold: int):
+        self.enabled = enabled
+        self.repeat_threshold = repeat_threshold
+        self.current: ContextVar[Optional[QueryTrace]] = ContextVar("query_trace", default=None)
+
+    def record(self, service: str, target: str, operation: str, request: httpx.Request, response: Optional[httpx.Response], status: str, duration: float):
+        """
+            Adds an upstream call to the trace of the request being handled, if there is one
+        """
+        trace = self.current.get()
+        if trace is None:
+            return
+        rows = None
+        content_range = response.headers.get("content-range") if response is not None else None
+        if content_range:
+            #PostgREST sends "first-last/total", or "*/total" when no range applies (e.g. an empty result or a HEAD count), which says nothing about the rows returned
+            first, _, last = content_range.split("/", 1)[0].partition("-")
+            rows = int(last) - int(first) + 1 if first.isdigit() and last.isdigit() else None
+        trace.record(service, target, operation, request, status, duration, rows)
+
+    def settings(self) -> dict:
+        return {"enabled": self.enabled, "repeat_threshold": self.repeat_threshold}
+
+
+class QueryTraceMiddleware:
+    """
+        ASGI middleware that, while tracing is on, collects every upstream query of a request, adds the X-Query-Trace summary header
+        and logs the full trace of requests that repeat one query shape repeat_threshold times or more (likely N+1 loops)
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not query_tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        trace = QueryTrace()
+        token = query_tracer.current.set(trace)
+        started_at = time.perf_counter()
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((QUERY_TRACE_HEADER.lower().encode(), trace.summary(query_tracer.repeat_threshold).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            query_tracer.current.reset(token)
+            repeated = trace.repeated_shapes(query_tracer.repeat_threshold)
+            if repeated:
+                elapsed_ms = (time.perf_counter() - started_at) * 1000
+                print(f"Possible N+1 in {scope['method']} {scope['path']} ({elapsed_ms:.1f} ms): {trace.summary(query_tracer.repeat_threshold)}")
+                for query in trace.queries:
+                    print(f"    {query}")
+
+
+query_tracer = QueryTracer(enabled=query_trace_enabled, repeat_threshold=query_trace_repeat_threshold)
+
+
+async def query_trace_endpoint(request: Request) -> Response:
+    """
+        GET returns the tracing settings, PUT changes them at runtime with a JSON body like {"enabled": true, "repeat_threshold": 3}.
+        Tracing applies to every request, so the switch is only served when METRICS_TOKEN is set and sent as a bearer token (404 otherwise)
+    """
+    if not operator_authorized(request, required=True):
+        return Response(status_code=404)
+
+    if request.method == "PUT":
+        try:
+            body = json.loads(await request.body() or b"{}")
+            enabled = body.get("enabled", query_tracer.enabled)
+            repeat_threshold = body.get("repeat_threshold", query_tracer.repeat_threshold)
+        except (ValueError, AttributeError):
+            return JSONResponse({"detail": "Body must be a JSON object"}, status_code=400)
+        if not isinstance(enabled, bool) or not isinstance(repeat_threshold, int) or isinstance(repeat_threshold, bool) or repeat_threshold < 2:
+            return JSONResponse({"detail": "enabled must be a boolean and repeat_threshold an integer of at least 2"}, status_code=400)
+        query_tracer.enabled = enabled
+        query_tracer.repeat_threshold = repeat_threshold
+
+    return JSONResponse(query_tracer.settings())
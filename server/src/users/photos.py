@@ -0,0 +1,153 @@
+import asyncio
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+from fastapi import UploadFile
+from PIL import Image, ImageOps
+from src.config import profile_photo_max_bytes, photo_workers
+
+#Storage bucket and folder that hold profile photos
+PHOTO_BUCKET = "ErgoProject"
+PHOTO_FOLDER = "user_profile_pictures"
+
+#Square thumbnail sizes (in pixels) produced for every profile photo, and the one stored as profile_photo_url
+THUMBNAIL_SIZES = (48, 128, 256)
+AVATAR_SIZE = 128
+
+#Accepted upload types and the leading bytes each type's files start with
+PHOTO_SIGNATURES = {
+    "image/jpeg": (b"\xff\xd8\xff",),
+    "image/png": (b"\x89PNG\r\n\x1a\n",),
+    "image/gif": (b"GIF87a", b"GIF89a"),
+    "image/webp": (b"RIFF",)
+}
+
+#Uploads are read in chunks of this many bytes so oversized files are rejected without being held in memory
+READ_CHUNK_SIZE = 64 * 1024
+
+#Largest decoded image accepted, which guards the workers against decompression bombs
+MAX_PHOTO_PIXELS = 40_000_000
+
+_photo_pool: Optional[ProcessPoolExecutor] = None
+
+
+class PhotoRejected(Exception):
+    """
+        Raised when an uploaded profile photo is too large, not an accepted image type or cannot be decoded
+    """
+    pass
+
+
+def _matches_signature(content_type: str, head: bytes) -> bool:
+    """
+        Whether the first bytes of a file match its declared content type
+    """
+    if content_type == "image/webp" and head[8:12] != b"WEBP":
+        return False
+    return any(head.startswith(signature) for signature in PHOTO_SIGNATURES[content_type])
+
+
+async def read_photo(upload: UploadFile, max_bytes: int = profile_photo_max_bytes) -> bytes:
+    """
+        Reads an uploaded photo chunk by chunk, rejecting it as soon as it goes over max_bytes or its contents do not match an accepted image type
+    """
+    if upload.content_type not in PHOTO_SIGNATURES:
+        raise PhotoRejected(f"Profile photo must be one of: {', '.join(PHOTO_SIGNATURES)}")
+    if upload.size is not None and upload.size > max_bytes:
+        raise PhotoRejected(f"Profile photo must be at most {max_bytes // 1024} KB")
+
+    chunks = []
+    total = 0
+    while chunk := await upload.read(READ_CHUNK_SIZE):
+        total += len(chunk)
+        if total > max_bytes:
+            raise PhotoRejected(f"Profile photo must be at most {max_bytes // 1024} KB")
+        if not chunks and not _matches_signature(upload.content_type, chunk[:16]):
+            raise PhotoRejected("Profile photo contents do not match its file type")
+        chunks.append(chunk)
+
+    if not chunks:
+        raise PhotoRejected("Profile photo is empty")
+    return b"".join(chunks)
+
+
+def make_thumbnails(photo: bytes, sizes: tuple = THUMBNAIL_SIZES) -> dict:
+    """
+        Decodes a photo and returns square, center-cropped WebP thumbnails keyed by size.
+        Runs in a worker process, so it only takes and returns plain bytes.
+    """
+    with Image.open(io.BytesIO(photo)) as image:
+        width, height = image.size
+        if width * height > MAX_PHOTO_PIXELS:
+            raise ValueError("Profile photo has too many pixels")
+
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        thumbnails = {}
+        for size in sizes:
+            thumbnail = ImageOps.fit(image, (size, size), method=Image.Resampling.LANCZOS)
+            output = io.BytesIO()
+            thumbnail.save(output, format="WEBP", quality=80, method=4)
+            thumbnails[size] = output.getvalue()
+        return thumbnails
+
+
+def _get_photo_pool() -> ProcessPoolExecutor:
+    """
+        Returns the process pool used for decoding and resizing, starting it on first use.
+        Workers are spawned rather than forked so they do not inherit the event loop or open connections.
+    """
+    global _photo_pool
+    if _photo_pool is None:
+        _photo_pool = ProcessPoolExecutor(max_workers=photo_workers, mp_context=multiprocessing.get_context("spawn"))
+    return _photo_pool
+
+
+def close_photo_pool():
+    """
+        Shuts down the photo worker processes. Called when the app shuts down
+    """
+    global _photo_pool
+    if _photo_pool is not None:
+        _photo_pool.shutdown(cancel_futures=True)
+        _photo_pool = None
+
+
+async def process_photo(upload: UploadFile) -> dict:
+    """
+        Reads, validates and resizes an uploaded photo off the event loop, returning its WebP thumbnails keyed by size
+    """
+    photo = await read_photo(upload)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_photo_pool(), make_thumbnails, photo)
+    except BrokenProcessPool:
+        #A worker died (e.g. killed for memory), so the next photo starts a fresh pool
+        close_photo_pool()
+        raise PhotoRejected("Profile photo could not be processed, please try again")
+    except Exception as e:
+        raise PhotoRejected(f"Profile photo could not be read: {e}")
+
+
+def photo_path(user_id: str, size: int) -> str:
+    """
+        Storage path of one size of a user's profile photo
+    """
+    return f"{PHOTO_FOLDER}/{user_id}/{size}.webp"
+
+
+async def upload_thumbnails(storage, user_id: str, thumbnails: dict) -> dict:
+    """
+        Uploads every thumbnail concurrently with the given Storage handle and returns their public URLs keyed by size
+    """
+    bucket = storage.from_(PHOTO_BUCKET)
+    await asyncio.gather(*(
+        bucket.upload(
+            path=photo_path(user_id, size),
+            file=contents,
+            file_options={"content-type": "image/webp", "upsert": "true", "cache-control": "3600"}
+        )
+        for size, contents in thumbnails.items()
+    ))
+    urls = await asyncio.gather(*(bucket.get_public_url(photo_path(user_id, size)) for size in thumbnails))
+    return dict(zip(thumbnails, urls))
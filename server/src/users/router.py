@@ -1,7 +1,8 @@
-from fastapi import APIRouter, status, HTTPException, Depends
+from fastapi import APIRouter, status, HTTPException, Depends, Response
 from src.auth.dependencies import get_current_user, AuthContext
 from gotrue.types import User
-from src.users.service import search_ergo_users
+from src.users.service import USER_SORT_KEYS, DEFAULT_SEARCH_LIMIT, search_ergo_users
+from src.pagination import PageParams, next_cursor, NEXT_CURSOR_HEADER
 from src.users.schemas import PublicUserProfile
 import uuid 
 
@@ -10,20 +11,27 @@ users_router = APIRouter(
 )
 
 @users_router.get("", status_code=status.HTTP_200_OK, response_model=list[PublicUserProfile])
-def find_ergo_user(
+async def find_ergo_user(
     user_query: str,
+    response: Response,
+    page: PageParams = Depends(),
     ctx: AuthContext = Depends(get_current_user) 
 ):
     """
-        Find other Ergo users based on their email or username 
+        Find other Ergo users based on their email or username.
+        Returns the best matches first, 20 at a time unless a limit is given. The cursor of the next page is returned in the X-Next-Cursor header.
     """
-    user_list = search_ergo_users(db=ctx.db, query_term=user_query, user_id=ctx.user.id)
+    user_list = await search_ergo_users(db=ctx.db, query_term=user_query, user_id=ctx.user.id, limit=page.limit, after=page.after_for(USER_SORT_KEYS))
 
     if "error" in user_list:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=user_list["error"]
         )
+
+    cursor = next_cursor(user_list, USER_SORT_KEYS, page.limit or DEFAULT_SEARCH_LIMIT)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
     
     return user_list 
 
@@ -0,0 +1,229 @@
+import asyncio
+import bisect
+import heapq
+import math
+import time
+from typing import Optional
+from src.config import user_search_refresh_seconds
+
+#Rows read per request while building the index
+BUILD_PAGE_SIZE = 1000
+
+#Fraction of the query's trigrams a fuzzy match must share
+MIN_TRIGRAM_OVERLAP = 0.5
+
+
+def _trigrams(text: str) -> set:
+    """
+        Every three character substring of the text
+    """
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _search_terms(profile: dict) -> list:
+    """
+        The lowercased values a profile can be found by: username, email, first name, last name and full name
+    """
+    first_name = (profile.get("first_name") or "").lower()
+    last_name = (profile.get("last_name") or "").lower()
+    terms = [
+        (profile.get("username") or "").lower(),
+        (profile.get("email") or "").lower(),
+        first_name,
+        last_name,
+        f"{first_name} {last_name}".strip()
+    ]
+    return [term for term in terms if term]
+
+
+class UserSearchIndex:
+    """
+        In-process search index over user profiles.
+        A trigram inverted index answers queries of three or more characters and a sorted term list answers shorter prefix queries.
+    """
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self.ready = False
+        self.built_at = 0.0
+        self._profiles = {}
+        self._terms = {}
+        self._postings = {}
+        self._prefixes = []
+        self._rebuilding = None
+        self._changed_during_build = None
+
+    def add(self, profile: dict):
+        """
+            Indexes a profile, replacing any earlier version of it
+        """
+        self._add(profile, keep_sorted=True)
+
+    def _add(self, profile: dict, keep_sorted: bool):
+        """
+            Indexes a profile. A build passes keep_sorted=False to append its terms and sorts the prefix list once at the end
+        """
+        user_id = str(profile["id"])
+        self.remove(user_id)
+
+        terms = _search_terms(profile)
+        self._profiles[user_id] = profile
+        self._terms[user_id] = terms
+
+        for trigram in set().union(*(_trigrams(term) for term in terms)):
+            self._postings.setdefault(trigram, set()).add(user_id)
+        for term in terms:
+            if keep_sorted:
+                bisect.insort(self._prefixes, (term, user_id))
+            else:
+                self._prefixes.append((term, user_id))
+
+        if self._changed_during_build is not None:
+            self._changed_during_build[user_id] = profile
+
+    def remove(self, user_id: str):
+        """
+            Removes a profile from the index
+        """
+        if self._changed_during_build is not None:
+            self._changed_during_build[user_id] = None
+
+        terms = self._terms.pop(user_id, None)
+        if terms is None:
+            return
+        self._profiles.pop(user_id, None)
+
+        for trigram in set().union(*(_trigrams(term) for term in terms)):
+            posting = self._postings.get(trigram)
+            if posting:
+                posting.discard(user_id)
+                if not posting:
+                    del self._postings[trigram]
+        for term in terms:
+            position = bisect.bisect_left(self._prefixes, (term, user_id))
+            if position < len(self._prefixes) and self._prefixes[position] == (term, user_id):
+                del self._prefixes[position]
+
+    async def build(self, client):
+        """
+            Reads every profile in pages (keyset on id) and swaps in a freshly built index.
+            Profiles added or removed while the pages are read are replayed onto the new index before the swap, so they are not lost.
+        """
+        fresh = UserSearchIndex(self.refresh_seconds)
+        last_id = None
+        self._changed_during_build = {}
+
+        try:
+            while True:
+                query = client.from_("userprofile").select("*").order("id").limit(BUILD_PAGE_SIZE)
+                if last_id:
+                    query = query.gt("id", last_id)
+                response = await query.execute()
+
+                for profile in response.data:
+                    fresh._add(profile, keep_sorted=False)
+                if len(response.data) < BUILD_PAGE_SIZE:
+                    break
+                last_id = response.data[-1]["id"]
+            fresh._prefixes.sort()
+
+            for user_id, profile in self._changed_during_build.items():
+                if profile is None:
+                    fresh.remove(user_id)
+                else:
+                    fresh.add(profile)
+        finally:
+            self._changed_during_build = None
+
+        self._profiles, self._terms = fresh._profiles, fresh._terms
+        self._postings, self._prefixes = fresh._postings, fresh._prefixes
+        self.built_at = time.monotonic()
+        self.ready = True
+
+    async def _refresh(self, client):
+        """
+            Background rebuild. A failed build is logged and the current index is kept until the next refresh interval, rather than
+            every search starting another full read
+        """
+        try:
+            await self.build(client)
+        except Exception as e:
+            print(f"Error refreshing user search index: {e}")
+        finally:
+            self.built_at = time.monotonic()
+
+    def refresh_if_stale(self, client):
+        """
+            Starts a background rebuild when the index is older than refresh_seconds, so signups handled by other workers show up.
+            Searches keep using the current index while it runs.
+        """
+        stale = time.monotonic() - self.built_at > self.refresh_seconds
+        if stale and (self._rebuilding is None or self._rebuilding.done()):
+            self._rebuilding = asyncio.create_task(self._refresh(client))
+
+    def _candidates(self, query: str):
+        """
+            Yields every candidate user ID once, with the fraction of the query's trigrams it shares
+        """
+        if len(query) < 3:
+            start = bisect.bisect_left(self._prefixes, (query,))
+            seen = set()
+            for position in range(start, len(self._prefixes)):
+                term, user_id = self._prefixes[position]
+                if not term.startswith(query):
+                    break
+                if user_id not in seen:
+                    seen.add(user_id)
+                    yield user_id, 0.0
+            return
+
+        query_trigrams = sorted(_trigrams(query), key=lambda trigram: len(self._postings.get(trigram, ())))
+        needed = math.ceil(len(query_trigrams) * MIN_TRIGRAM_OVERLAP)
+
+        #Any user sharing `needed` trigrams must appear in one of the rarest (total - needed + 1) postings
+        seed_postings = query_trigrams[:len(query_trigrams) - needed + 1]
+        seeds = set().union(*(self._postings.get(trigram, set()) for trigram in seed_postings))
+
+        postings = [self._postings.get(trigram, set()) for trigram in query_trigrams]
+        for user_id in seeds:
+            shared = sum(1 for posting in postings if user_id in posting)
+            if shared >= needed:
+                yield user_id, shared / len(query_trigrams)
+
+    def search(self, query_term: str, exclude_id: str, limit: int, after: Optional[list] = None) -> list:
+        """
+            Returns up to limit profiles ranked by exact, prefix, substring and trigram similarity.
+            Each row carries a search_rank (lower is better) so results can be paged with (search_rank, username) cursors.
+            Every candidate is scored and only the best limit are kept, so common fragments (e.g. "gmail") cannot push out the exact match.
+        """
+        query = query_term.strip().lower()
+        if not query:
+            return []
+
+        cursor = (float(after[0]), str(after[1])) if after is not None else None
+        ranked = []
+        for user_id, overlap in self._candidates(query):
+            if user_id == exclude_id:
+                continue
+
+            terms = self._terms[user_id]
+            if query in terms:
+                score = 3.0
+            elif any(term.startswith(query) for term in terms):
+                score = 2.0
+            elif any(query in term for term in terms):
+                score = 1.0
+            else:
+                score = 0.0
+
+            entry = (-(score + overlap), self._profiles[user_id]["username"], user_id)
+            if cursor is None or entry[:2] > cursor:
+                ranked.append(entry)
+
+        #Only the returned profiles are copied
+        return [
+            {**self._profiles[user_id], "search_rank": rank}
+            for rank, _, user_id in heapq.nsmallest(limit, ranked)
+        ]
+
+
+user_search_index = UserSearchIndex(refresh_seconds=user_search_refresh_seconds)
@@ -1,24 +1,66 @@
-from src.database import supabase
+from src.database import get_service_db
+from src.config import user_search_mode
+from src.users.search import user_search_index
+from typing import Optional
 import uuid 
 
-def search_ergo_users(db, query_term: str, user_id: uuid.UUID):
+#Search results are ranked, so pages are ordered by rank and then by the unique username
+USER_SORT_KEYS = ["search_rank", "username"]
+
+#Number of matches returned when the caller does not pass a limit
+DEFAULT_SEARCH_LIMIT = 20
+
+async def build_user_search_index():
+    """
+        Builds the in-process user search index from every user profile. Called once at startup
+    """
+    if user_search_mode != "index":
+        return
+    try:
+        await user_search_index.build(get_service_db())
+    except Exception as e:
+        print(f"Error building user search index: {e}")
+
+async def search_ergo_users(db, query_term: str, user_id: uuid.UUID, limit: Optional[int] = None, after: Optional[list] = None):
     """
-        Queries the userprofile table by name or email to find users 
+        Finds users by username, email or name, best matches first.
+        Uses the in-process search index, the pg_trgm search_userprofiles function (USER_SEARCH_MODE=trgm),
+        or a plain ilike query while the index has not been built yet.
     """
+    limit = limit or DEFAULT_SEARCH_LIMIT
 
     print(query_term)
     try:
-        user_response = ( 
+        if after is not None and len(after) != len(USER_SORT_KEYS):
+            return {"error": "Cursor does not match the sort order of this list"}
+
+        if user_search_mode == "trgm":
+            user_response = await db.rpc("search_userprofiles", {
+                "search_term": query_term,
+                "exclude_id": str(user_id),
+                "result_limit": limit,
+                "after_rank": after[0] if after else None,
+                "after_username": after[1] if after else None
+            }).execute()
+            return user_response.data
+
+        if user_search_index.ready:
+            user_search_index.refresh_if_stale(get_service_db())
+            return user_search_index.search(query_term, str(user_id), limit, after)
+
+        user_query = (
             db.from_("userprofile")
             .select("*") 
             .or_(f"email.ilike.%{query_term}%,username.ilike.%{query_term}%")
             .neq("id", user_id)
-            .execute()
-        )       
+            .order("username")
+            .limit(limit)
+        )
+        if after is not None:
+            user_query = user_query.gt("username", after[1])
+        user_response = await user_query.execute()
         print("User Response: ", user_response)  
-        return user_response.data 
+        return [{**user, "search_rank": 0.0} for user in user_response.data]
     
     except Exception as e:
         return {"error": str(e)}
-    
-
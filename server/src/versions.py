@@ -0,0 +1,194 @@
+import hashlib
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+from fastapi import HTTPException, Request, Response, status
+from src.config import etag_cache_size, etag_ttl_seconds
+
+#Response header that carries the version of a resource
+ETAG_HEADER = "ETag"
+
+
+class ResourceVersion:
+    """
+        The current version token of one resource and the users that have read that resource through RLS
+    """
+    def __init__(self):
+        self.token = uuid.uuid4().hex
+        self.authorized_users = set()
+        self.created_at = time.monotonic()
+
+
+class ResourceVersions:
+    """
+        Bounded LRU registry of version tokens for readable resources, e.g. ("project", id) or ("project_tasks", id).
+        The write paths bump a resource's token, which changes the ETag of every response built from it.
+        Tokens are random and expire after ttl_seconds, so ETags handed out before a restart or a write made by another process stop matching.
+    """
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._versions = OrderedDict()
+        self._task_projects = OrderedDict()
+        self._row_versions = OrderedDict()
+
+    def _version(self, resource: tuple) -> ResourceVersion:
+        """
+            Returns the live version of a resource, starting a new one when it is missing or expired
+        """
+        key = (resource[0], str(resource[1]))
+        version = self._versions.get(key)
+        if version is None or time.monotonic() - version.created_at > self.ttl_seconds:
+            version = ResourceVersion()
+            self._versions[key] = version
+        self._versions.move_to_end(key)
+
+        while len(self._versions) > self.max_size:
+            self._versions.popitem(last=False)
+        return version
+
+    def etag(self, resources: list, variant: str = "") -> str:
+        """
+            Returns the ETag of a response built from these resources.
+            variant distinguishes different responses built from the same resources, e.g. the query string of a paginated list
+        """
+        tokens = [self._version(resource).token for resource in resources]
+        digest = hashlib.sha256("|".join(tokens + [variant]).encode()).hexdigest()
+        return f'"{digest[:32]}"'
+
+    def is_authorized(self, resources: list, user_id) -> bool:
+        """
+            Whether the user has read every one of these resources through RLS since they were last revoked
+        """
+        return all(str(user_id) in self._version(resource).authorized_users for resource in resources)
+
+    def authorize(self, resources: list, user_id):
+        """
+            Records that the user just read these resources through RLS
+        """
+        for resource in resources:
+            self._version(resource).authorized_users.add(str(user_id))
+
+    def revoke(self, resource: tuple, user_id):
+        """
+            Stops answering conditional requests for a resource from a user without reading it, e.g. after they leave a project
+        """
+        version = self._versions.get((resource[0], str(resource[1])))
+        if version:
+            version.authorized_users.discard(str(user_id))
+
+    def bump(self, *resources: tuple):
+        """
+            Gives resources a new version after a write. The users that were authorized to read them stay authorized
+        """
+        for resource in resources:
+            key = (resource[0], str(resource[1]))
+            old_version = self._versions.pop(key, None)
+            version = self._version(resource)
+            if old_version:
+                version.authorized_users = old_version.authorized_users
+
+    def drop(self, *resources: tuple):
+        """
+            Forgets resources that no longer exist
+        """
+        for resource in resources:
+            self._versions.pop((resource[0], str(resource[1])), None)
+
+    def bump_kind(self, kind: str):
+        """
+            Gives every resource of a kind a new version, used when a write cannot be narrowed down to one resource
+        """
+        for key in [key for key in self._versions if key[0] == kind]:
+            self.bump(key)
+
+    def remember_task(self, task_id, project_id):
+        """
+            Records which project a task belongs to, so task reads and writes can find the version of the project's tasks
+        """
+        self._task_projects[str(task_id)] = str(project_id)
+        self._task_projects.move_to_end(str(task_id))
+        while len(self._task_projects) > self.max_size:
+            self._task_projects.popitem(last=False)
+
+    def project_of_task(self, task_id) -> Optional[str]:
+        """
+            Returns the project a task belongs to, if it is known
+        """
+        return self._task_projects.get(str(task_id))
+
+    def sent_row(self, etag: str, version: Optional[int]):
+        """
+            Records the row version sent with a single-row ETag, so clients can send that ETag back in If-Match
+        """
+        if version is None:
+            return
+        self._row_versions[etag] = version
+        self._row_versions.move_to_end(etag)
+        while len(self._row_versions) > self.max_size:
+            self._row_versions.popitem(last=False)
+
+    def row_version(self, etag: str) -> Optional[int]:
+        """
+            Returns the row version a single-row ETag was sent with, if it is still known
+        """
+        return self._row_versions.get(etag)
+
+    def task_changed(self, task_id, project_id=None):
+        """
+            Bumps the version of the tasks of the project a task belongs to.
+            When the project is not known every project's tasks are bumped, since some client may still hold an ETag built from the task
+        """
+        project_id = project_id or self.project_of_task(task_id)
+        if project_id is None:
+            self.bump_kind("project_tasks")
+            return
+        self.remember_task(task_id, project_id)
+        self.bump(("project_tasks", project_id))
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+        Whether the request's If-None-Match header already names this ETag (weak comparison)
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in (candidate.strip().removeprefix("W/") for candidate in header.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    """
+        The empty 304 response returned when the client's copy is still current
+    """
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={ETAG_HEADER: etag})
+
+
+def if_match_version(request: Request) -> Optional[int]:
+    """
+        Dependency that reads the row version a client expects from its If-Match header, either the row version ("3", W/"3" or 3)
+        or the ETag of the single-row GET it read the row from. Returns None when the request has no precondition
+    """
+    header = request.headers.get("if-match")
+    if not header or header.strip() == "*":
+        return None
+    candidate = header.strip().removeprefix("W/")
+    try:
+        return int(candidate.strip('"'))
+    except ValueError:
+        pass
+
+    version = resource_versions.row_version(candidate)
+    if version is None:
+        #ETags expire and are not shared between processes, so the client has to read the row again
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="If-Match must be the version of the row being updated or a current ETag of it"
+        )
+    return version
+
+
+resource_versions = ResourceVersions(max_size=etag_cache_size, ttl_seconds=etag_ttl_seconds)